@@ -0,0 +1,119 @@
+import argparse
+import time
+
+import torch
+
+from plum.dataio import BatchSequenceNDTensor
+from plum.types import Variable
+
+
+# Run from the repo root, e.g. PYTHONPATH=. python benchmarks/bench_collate.py
+# Collates random batches of variable length sequences with
+# dataio.pipeline.batch_sequence_ndtensor, and with the implementation it
+# replaced (one pad tensor and cat per item, then a cat over the batch),
+# checking that both give the same Variables.
+
+def old_batch_sequence_ndtensor(batch, sequence_dim, pad_value, batch_dim=0,
+                                pad_right=True):
+    lengths = [item.size(sequence_dim) for item in batch]
+    max_length = max(lengths)
+    pad_lengths = [max_length - l for l in lengths]
+    batch = list(batch)
+
+    for i, pad_length in enumerate(pad_lengths):
+        if pad_length == 0:
+            batch[i] = batch[i].unsqueeze(batch_dim)
+            continue
+
+        pad_dims = list(batch[i].size())
+        pad_dims[sequence_dim] = pad_length
+        pad_tensor = batch[i].new(*pad_dims).fill_(pad_value)
+
+        if pad_right:
+            batch[i] = torch.cat([batch[i], pad_tensor], dim=sequence_dim)
+        else:
+            batch[i] = torch.cat([pad_tensor, batch[i]], dim=sequence_dim)
+        batch[i] = batch[i].unsqueeze(batch_dim)
+
+    seq_dim = sequence_dim
+    if batch_dim <= sequence_dim:
+        seq_dim += 1
+    tensor = torch.cat(batch, dim=batch_dim)
+
+    return Variable(tensor, lengths=torch.LongTensor(lengths),
+                    length_dim=seq_dim, batch_dim=batch_dim,
+                    pad_value=pad_value)
+
+def random_batches(num_batches, batch_size, num_fields, min_length,
+                   max_length, feature_size):
+    batches = []
+    for _ in range(num_batches):
+        fields = []
+        for _ in range(num_fields):
+            lengths = torch.randint(min_length, max_length + 1,
+                                    (batch_size,)).tolist()
+            if feature_size > 0:
+                fields.append([torch.randn(length, feature_size)
+                               for length in lengths])
+            else:
+                fields.append([torch.randint(0, 1000, (length,))
+                               for length in lengths])
+        batches.append(fields)
+    return batches
+
+def check_same(new, old):
+    assert torch.equal(new.data, old.data)
+    assert torch.equal(new.lengths, old.lengths)
+    assert new.length_dim == old.length_dim
+    assert new.batch_dim == old.batch_dim
+
+def time_collate(collate, batches):
+    start = time.perf_counter()
+    for fields in batches:
+        for items in fields:
+            collate(items)
+    return (time.perf_counter() - start) / len(batches) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+",
+                        default=[16, 64])
+    parser.add_argument("--fields", type=int, default=23)
+    parser.add_argument("--min-length", type=int, default=5)
+    parser.add_argument("--max-length", type=int, default=40)
+    parser.add_argument("--feature-size", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    # (batch_dim, sequence_dim, pad_right) layouts checked against the old
+    # implementation.
+    layouts = [(0, 0, True), (1, 0, True), (0, 0, False), (1, 0, False)]
+
+    for batch_size in args.batch_sizes:
+        batches = random_batches(
+            args.batches, batch_size, args.fields, args.min_length,
+            args.max_length, args.feature_size)
+
+        for batch_dim, sequence_dim, pad_right in layouts:
+            new = BatchSequenceNDTensor(
+                batch_dim=batch_dim, sequence_dim=sequence_dim,
+                pad_value=0, pad_right=pad_right)
+            for items in batches[0]:
+                check_same(
+                    new(list(items)),
+                    old_batch_sequence_ndtensor(
+                        items, sequence_dim, 0, batch_dim=batch_dim,
+                        pad_right=pad_right))
+
+        new = BatchSequenceNDTensor(sequence_dim=0, pad_value=0)
+        old_ms = time_collate(
+            lambda items: old_batch_sequence_ndtensor(items, 0, 0), batches)
+        new_ms = time_collate(lambda items: new(list(items)), batches)
+        print("batch size {:4d}: old {:7.2f} ms  new {:7.2f} ms  "
+              "per batch of {} fields ({:.1f}x)".format(
+                  batch_size, old_ms, new_ms, args.fields, old_ms / new_ms))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import time
+from pathlib import Path
+
+import torch
+
+import plum
+from plum.layers import LinearPredictor
+from plum.seq2seq.search import VocabShortlist
+
+
+# Run from the repo root, e.g.
+#     PYTHONPATH=. python benchmarks/bench_shortlist.py \
+#         --config configs/styleeq.jsonnet --checkpoint model.pth
+#
+# Speed: time one search step of the output projection (log softmax and
+# the beam top-k) over the full vocab and over random shortlists, with a
+# randomly initialized layers.linear_predictor.
+#
+# Accuracy: with --config, run the searches of a trainer program over its
+# validation batches with and without seq2seq.search.vocab_shortlist
+# shortlists of several top_n sizes, and report how many outputs agree with
+# the full softmax search. The shortlist vocabs are those of the model's
+# search_shortlist if it has one, otherwise --source-vocab/--target-vocab
+# name vocabs of the config. --checkpoint loads trained model parameters
+# saved with the config.
+
+def time_projection(args):
+    predictor = LinearPredictor(in_feats=args.hidden_size,
+                                num_classes=args.vocab_size)
+    for param in predictor.parameters():
+        torch.nn.init.normal_(param)
+    inputs = torch.randn(1, args.rows, args.hidden_size)
+
+    def time_step(**kwargs):
+        key = "log_probs" if len(kwargs) == 0 else "shortlist_log_probs"
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            torch.topk(predictor(inputs, **kwargs)[key].data,
+                       args.beam_size, dim=2)
+        return (time.perf_counter() - start) / args.steps * 1000
+
+    with torch.no_grad():
+        full_ms = time_step()
+        print("projection {} rows x {} hidden, vocab {}".format(
+            args.rows, args.hidden_size, args.vocab_size))
+        print("  full vocab       {:8.1f} ms/step".format(full_ms))
+        for size in args.shortlist_sizes:
+            indices = torch.randperm(args.vocab_size)[:size].sort()[0]
+            shortlist = predictor.shortlist(indices)
+            ms = time_step(shortlist=shortlist)
+            print("  shortlist {:6d} {:8.1f} ms/step ({:.1f}x)".format(
+                size, ms, full_ms / ms))
+
+def _search_outputs(model, searches, batches, shortlister):
+    outputs = {name: [] for name in searches}
+    times = {name: 0. for name in searches}
+    sizes = []
+    with torch.no_grad():
+        for batch in batches:
+            encoder_state = model.encode(batch)
+            controls = None
+            if isinstance(encoder_state, tuple):
+                encoder_state, controls = encoder_state
+            shortlist = shortlister(batch) if shortlister else None
+            if shortlist is not None:
+                sizes.append(shortlist.numel())
+            for name, search in searches.items():
+                kwargs = {"controls": controls}
+                if shortlist is not None:
+                    kwargs["shortlist"] = shortlist
+                start = time.perf_counter()
+                search(model.decoder, encoder_state, **kwargs)
+                times[name] += time.perf_counter() - start
+                outputs[name].extend(search.output())
+    return outputs, times, sizes
+
+def search_agreement(args):
+    parser = plum.PlumParser(
+        vocab_cache=Path(args.vocab_cache) if args.vocab_cache else None)
+    _, pointers = parser.parse_file(args.config)
+    trainer = pointers["programs"][args.program]
+    model = trainer.model
+    if args.checkpoint is not None:
+        model.load_state_dict(plum.load(args.checkpoint).state_dict())
+    else:
+        model.initialize_parameters()
+    model.eval()
+    if args.gpu > -1:
+        model.cuda(args.gpu)
+        trainer.valid_batches.gpu = args.gpu
+
+    if model.search_shortlist is not None:
+        source_vocab = model.search_shortlist.source_vocab
+        target_vocab = model.search_shortlist.target_vocab
+        source_inputs = model.search_shortlist.source_inputs
+    else:
+        source_vocab = pointers["vocabs"][args.source_vocab]
+        target_vocab = pointers["vocabs"][args.target_vocab]
+        source_inputs = args.source_inputs
+
+    batches = list(trainer.valid_batches)
+    searches = trainer.searches
+    full, full_times, _ = _search_outputs(model, searches, batches, None)
+    print("searches over {} batches, target vocab {}".format(
+        len(batches), len(target_vocab)))
+    print("  full vocab:",
+          {name: round(t, 3) for name, t in full_times.items()}, "s")
+
+    for top_n in args.top_n:
+        shortlister = VocabShortlist(
+            source_vocab=source_vocab, target_vocab=target_vocab,
+            source_inputs=source_inputs, top_n=top_n, max_fraction=1.0)
+        outputs, times, sizes = _search_outputs(
+            model, searches, batches, shortlister)
+        agreement = {
+            name: round(sum(a == b for a, b in zip(outputs[name],
+                                                   full[name]))
+                        / max(1, len(full[name])), 3)
+            for name in searches}
+        print("  top_n {:5d}: avg shortlist {:7.1f} agreement {} "
+              "time {} s".format(
+                  top_n, sum(sizes) / max(1, len(sizes)), agreement,
+                  {name: round(t, 3) for name, t in times.items()}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vocab-size", type=int, default=50000)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--rows", type=int, default=512,
+                        help="decoder rows per step, e.g. batch x beam")
+    parser.add_argument("--beam-size", type=int, default=8)
+    parser.add_argument("--shortlist-sizes", type=int, nargs="+",
+                        default=[1000, 3000, 10000])
+    parser.add_argument("--steps", type=int, default=20)
+
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--program", default="train")
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--vocab-cache", default=None)
+    parser.add_argument("--gpu", type=int, default=-1)
+    parser.add_argument("--source-vocab", default="source_tokens")
+    parser.add_argument("--target-vocab", default="target_tokens")
+    parser.add_argument("--source-inputs", default="source_inputs")
+    parser.add_argument("--top-n", type=int, nargs="+",
+                        default=[0, 100, 1000, 2000, 5000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    time_projection(args)
+    if args.config is not None:
+        search_agreement(args)
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,9 @@ from . import loggers
 def load(path):
     import torch
     import json
+    from .vocab_file import is_vocab_file, read_vocab_file
+    if is_vocab_file(path):
+        return read_vocab_file(path)
     data = torch.load(path, map_location="cpu")
     obj, _ = parser.PlumParser()._build_config(json.loads(data["plum_data"]))
     if data["state_dict"] is not None:
@@ -21,6 +21,9 @@ from . import vocab
 
 from .batch_variables import BatchVariables
 from .bins_feature import ThresholdFeature
+from .threshold_features import ThresholdFeatures
 from .load_vocab import LoadVocab
 from .mmap_jsonl import MMAPJSONL
 from .stack_ds import StackDatasource
+from .compiled_pipelines import CompiledPipelines
+from .sharded_jsonl import ShardedJSONL
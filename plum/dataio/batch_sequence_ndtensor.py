@@ -25,30 +25,49 @@ class BatchSequenceNDTensor(PlumObject):
 
         lengths = [item.size(self.sequence_dim) for item in batch]
         max_length = max(lengths)
-        pad_lengths = [max_length - l for l in lengths]
+        lengths = torch.LongTensor(lengths)
 
-        for i, pad_length in enumerate(pad_lengths):
-            if pad_length == 0:
-                batch[i] = batch[i].unsqueeze(self.batch_dim)
-                continue
+        # Concatenate all items along the sequence dim with one cat, then
+        # scatter them into a padded [batch x max_length x other dims]
+        # buffer with one masked_scatter_, instead of padding and
+        # concatenating each item separately. Copying items into the buffer
+        # one by one avoids the cat but is slower for typical batches. The
+        # buffer is copied once more if the batch and sequence dims are
+        # asked for in a different layout.
+        other_dims = [d for d in range(batch[0].dim())
+                      if d != self.sequence_dim]
+        if self.sequence_dim != 0:
+            batch = [item.permute(self.sequence_dim, *other_dims)
+                     for item in batch]
+        data = torch.cat(batch, 0)
+        buffer_dims = [len(batch), max_length] + list(data.size())[1:]
+        tensor = data.new_empty(buffer_dims)
+        tensor.fill_(self.pad_value)
 
-            pad_dims = list(batch[i].size())
-            pad_dims[self.sequence_dim] = pad_length
-            pad_tensor = batch[i].new(*pad_dims).fill_(self.pad_value)
+        steps = torch.arange(max_length).view(1, -1)
+        if self.pad_right:
+            mask = steps < lengths.view(-1, 1)
+        else:
+            mask = steps >= (max_length - lengths).view(-1, 1)
+        mask = mask.view(*mask.size(), *[1] * len(other_dims))
+        tensor.masked_scatter_(mask.expand_as(tensor), data)
 
-            if self.pad_right:
-                batch[i] = torch.cat([batch[i], pad_tensor], 
-                                     dim=self.sequence_dim)
-            else:
-                batch[i] = torch.cat([pad_tensor, batch[i]], 
-                                     dim=self.sequence_dim)
-            batch[i] = batch[i].unsqueeze(self.batch_dim)
+        # Move the batch and sequence dims to where they were asked for.
+        # "b" is the batch dim, "s" the sequence dim, ints the other dims.
+        buffer_order = ["b", "s"] + other_dims
+        target_order = list(range(batch[0].dim()))
+        target_order[self.sequence_dim] = "s"
+        target_order.insert(self.batch_dim, "b")
+        if target_order != buffer_order:
+            permuted = tensor.permute(
+                *[buffer_order.index(d) for d in target_order])
+            tensor = data.new_empty(list(permuted.size()))
+            tensor.copy_(permuted)
 
         seq_dim = self.sequence_dim
         if self.batch_dim <= self.sequence_dim:
             seq_dim += 1
-        tensor = torch.cat(batch, dim=self.batch_dim)
         
-        return Variable(tensor, lengths=torch.LongTensor(lengths), 
+        return Variable(tensor, lengths=lengths, 
                         length_dim=seq_dim, batch_dim=self.batch_dim,
                         pad_value=self.pad_value)
@@ -1,8 +1,32 @@
 from ..types import register, PlumObject, HP, props
-from torch.utils.data import DataLoader
+from .projection import pipeline_fields
+from .samplers import (
+    PlannedBatchSampler, BucketBatchSampler, TokenBudgetBatchSampler,
+    EpochBatchSampler, load_lengths)
+import numpy as np
+import inspect
+from torch.utils.data import (
+    DataLoader, BatchSampler, RandomSampler, SequentialSampler)
+import torch
 from math import ceil
 
 
+class _BatchFetcher(object):
+
+    # Dataset view whose items are whole batches, fetched with the
+    # datasource's get_many. It is used with a batch sampler as the
+    # DataLoader's sampler and a batch size of 1.
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, indices):
+        return self.dataset.get_many(indices)
+
+    def __len__(self):
+        return len(self.dataset)
+
+
 @register("dataio.batches")
 class Batches(PlumObject):
 
@@ -17,8 +41,67 @@ class Batches(PlumObject):
     sort_key = HP(required=False)
     sort_descending = HP(default=True, type=props.BOOLEAN)
 
-    def __pluminit__(self):
+    project_fields = HP(default=False, type=props.BOOLEAN)
+
+    bucket_batches = HP(default=False, type=props.BOOLEAN)
+    bucket_width = HP(default=1, type=props.POSITIVE)
+    max_tokens = HP(default=0, type=props.INTEGER)
+    max_tokens_keys = HP(required=False)
+    seed = HP(required=False)
+
+    pin_memory = HP(default=False, type=props.BOOLEAN)
+    prefetch = HP(default=False, type=props.BOOLEAN)
+
+    persistent_workers = HP(default=False, type=props.BOOLEAN)
+    prefetch_factor = HP(default=2, type=props.POSITIVE)
+
+    def __pluminit__(self, project_fields):
         self._gpu = -1
+        self._batch_sampler = None
+        self._epoch = 0
+        self._loader_iter = None
+        self._loader_in_sync = False
+        if self.streaming and self.uses_batch_sampler:
+            raise ValueError(
+                "Streaming datasources do not support bucket_batches, " \
+                "max_tokens, or persistent_workers.")
+        if self.max_tokens > 0 and self.max_tokens_keys is None:
+            # Batches cannot tell which fields are sources and targets, so
+            # the getters of every length that counts towards the budget
+            # (e.g. source and target lengths) must be given.
+            raise ValueError(
+                "max_tokens_keys is required when max_tokens > 0.")
+        if project_fields:
+            self._project_dataset()
+
+    def _project_dataset(self):
+        # Restrict dataset items to the fields read by the pipelines and
+        # sort key so the datasource does not hold on to sub-objects that
+        # are never used. Only dataio.jsonl datasources (directly or inside
+        # parallel/stacked datasources) support this; the others decode
+        # whole records on every access, so pruning them would save nothing.
+        # Note that this affects every other user of the same datasource.
+        if not hasattr(self.dataset, "add_projection"):
+            raise ValueError(
+                "Cannot project fields of {}, only dataio.jsonl " \
+                "datasources support project_fields.".format(
+                    type(self.dataset).__name__))
+        for name in self.collate_funcs:
+            if name not in self.pipelines:
+                raise ValueError(
+                    "Cannot project fields when collate func {} reads " \
+                    "raw items.".format(name))
+        getters = list(self.pipelines.values())
+        if self.sort or self.bucket_batches:
+            getters.append(self.sort_key if self.sort_key is not None else [])
+        if self.max_tokens > 0:
+            getters.extend([key if key is not None else []
+                            for key in self._max_tokens_keys()])
+        fields = pipeline_fields(getters)
+        if fields is None:
+            raise ValueError(
+                "Cannot project fields when a pipeline reads whole items.")
+        self.dataset.add_projection(fields)
 
     @property
     def gpu(self):
@@ -71,33 +154,247 @@ class Batches(PlumObject):
 
         return output
 
+    def _max_tokens_keys(self):
+        # Getters whose lengths count towards the max_tokens budget, e.g.
+        # source and target lengths.
+        return self.max_tokens_keys
+
+    @property
+    def uses_batch_sampler(self):
+        return self.bucket_batches or self.max_tokens > 0 \
+            or self.persistent_workers
+
+    @property
+    def batch_sampler(self):
+        # Groups items of similar sort_key length into batches when
+        # bucket_batches is true, and/or packs batches up to max_tokens
+        # padded tokens when max_tokens > 0. Item lengths are computed on
+        # first use and cached next to the datasource. Batch plans depend
+        # only on seed and epoch, so runs with a seed reproduce.
+        if not self.uses_batch_sampler:
+            return None
+        if self._batch_sampler is not None:
+            return self._batch_sampler
+
+        token_lengths = None
+        if self.max_tokens > 0:
+            token_lengths = np.stack(
+                [load_lengths(self.dataset, key)
+                 for key in self._max_tokens_keys()],
+                axis=1)
+
+        # The persistent loader reads ahead into the next epoch, so its
+        # plans must be reproducible from the epoch alone.
+        seed = self.seed
+        if seed is None and self.persistent_workers:
+            seed = np.random.randint(2 ** 31)
+
+        if self.bucket_batches:
+            lengths = load_lengths(self.dataset, self.sort_key)
+            self._batch_sampler = BucketBatchSampler(
+                lengths, self.batch_size, shuffle=self.shuffle,
+                bucket_width=self.bucket_width, max_tokens=self.max_tokens,
+                token_lengths=token_lengths, seed=seed)
+        elif self.max_tokens > 0:
+            self._batch_sampler = TokenBudgetBatchSampler(
+                token_lengths, self.max_tokens, shuffle=self.shuffle,
+                seed=seed)
+        else:
+            self._batch_sampler = PlannedBatchSampler(
+                len(self.dataset), self.batch_size, shuffle=self.shuffle,
+                seed=seed)
+        return self._batch_sampler
+
+    @property
+    def streaming(self):
+        return getattr(self.dataset, "streaming", False)
+
+    @property
+    def use_cuda(self):
+        return self.gpu > -1 and torch.cuda.is_available()
+
+    def _dataloader_kwargs(self):
+        # Pinning only applies when batches will be moved to a gpu. 
+        # Variables implement pin_memory, so the DataLoader pins them too.
+        kwargs = {
+            "num_workers": self.num_workers,
+            "pin_memory": self.pin_memory and self.use_cuda,
+        }
+        # Older DataLoaders always prefetch 2 batches per worker.
+        if self.num_workers > 0 and "prefetch_factor" in \
+                inspect.signature(DataLoader.__init__).parameters:
+            kwargs["prefetch_factor"] = self.prefetch_factor
+        return kwargs
+
+    def _collate_fetched(self, batches):
+        return self._collate_fn(batches[0])
+
+    def _dataloader(self, batch_sampler=None):
+        # Without a planned batch sampler, batches are drawn the same way
+        # the DataLoader draws them for batch_size/shuffle.
+        if batch_sampler is None and self.uses_batch_sampler:
+            batch_sampler = self.batch_sampler
+        elif batch_sampler is None:
+            if self.shuffle:
+                sampler = RandomSampler(self.dataset)
+            else:
+                sampler = SequentialSampler(self.dataset)
+            batch_sampler = BatchSampler(sampler, self.batch_size, False)
+
+        # Datasources with get_many fetch each batch in one call.
+        if hasattr(self.dataset, "get_many"):
+            return DataLoader(
+                _BatchFetcher(self.dataset),
+                sampler=batch_sampler,
+                batch_size=1,
+                collate_fn=self._collate_fetched,
+                **self._dataloader_kwargs())
+        else:
+            return DataLoader(
+                self.dataset,
+                batch_sampler=batch_sampler,
+                collate_fn=self._collate_fn,
+                **self._dataloader_kwargs())
+
+    def _persistent_batches(self):
+        # With persistent_workers, one DataLoader iterator runs over an
+        # endless EpochBatchSampler, so worker processes (and their copies
+        # of the datasources and pipelines) live across epochs and start on
+        # the next epoch's batches while the current one finishes. Each
+        # epoch takes exactly its planned number of batches. If an epoch is
+        # abandoned part way, the iterator is out of step and is replaced.
+        sampler = self.batch_sampler
+        if self._loader_iter is None or not self._loader_in_sync:
+            self._loader_iter = None
+            sampler.set_epoch(self._epoch)
+            self._loader_iter = iter(
+                self._dataloader(EpochBatchSampler(sampler)))
+
+        num_batches = sampler.num_batches(self._epoch)
+        self._epoch += 1
+        self._loader_in_sync = False
+        for _ in range(num_batches):
+            yield next(self._loader_iter)
+        self._loader_in_sync = True
+
+    def close(self):
+        # Shut down the persistent DataLoader iterator and its workers. The
+        # iterator's collate fn is a bound method of these batches, so the
+        # two hold each other alive until this is called (or the cycle
+        # collector runs). The next pass over the batches starts a new one.
+        self._loader_iter = None
+        self._loader_in_sync = False
+
+    def _streaming_uses_workers(self):
+        return isinstance(
+            self.dataset, getattr(torch.utils.data, "IterableDataset", ()))
+
+    def _streaming_batches(self):
+        # Iterable datasources (e.g. dataio.sharded_jsonl) are batched in
+        # the order they stream, and shuffle themselves. Each pass over
+        # the batches starts a new epoch of the datasource. DataLoaders
+        # without iterable dataset support stream in this process.
+        self.dataset.set_epoch(self._epoch)
+        self._epoch += 1
+        if self._streaming_uses_workers():
+            for batch in DataLoader(self.dataset,
+                                    batch_size=self.batch_size,
+                                    collate_fn=self._collate_fn,
+                                    **self._dataloader_kwargs()):
+                yield batch
+            return
+
+        batch = []
+        for item in self.dataset:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                yield self._collate_fn(batch)
+                batch = []
+        if len(batch) > 0:
+            yield self._collate_fn(batch)
+
     def __iter__(self):
-        dataloader = DataLoader(
-            self.dataset,
-            batch_size=self.batch_size,
-            shuffle=self.shuffle,
-            num_workers=self.num_workers,
-            collate_fn=self._collate_fn)
+        if self.streaming:
+            dataloader = self._streaming_batches()
+        elif self.persistent_workers:
+            dataloader = self._persistent_batches()
+        else:
+            dataloader = self._dataloader()
+
+        if self.prefetch and self.use_cuda:
+            for batch in self._prefetch_to_gpu(dataloader):
+                yield batch
+            return
 
         for batch in dataloader:
             if self.gpu > -1:
-                batch = self.batch2gpu(batch)
+                batch = self.batch2gpu(batch, non_blocking=self.pin_memory)
             
             yield batch
 
+    def _prefetch_to_gpu(self, dataloader):
+        # Copy batch i + 1 to the gpu on a side stream while the caller
+        # works on batch i. Before a batch is handed out, the current stream
+        # waits on that batch's copy only, and its tensors are marked as in
+        # use by the current stream so the allocator does not reuse them
+        # early.
+        stream = torch.cuda.Stream(device=self.gpu)
+        pending = None
+        for batch in dataloader:
+            with torch.cuda.stream(stream):
+                batch = self.batch2gpu(batch, non_blocking=True)
+                copied = torch.cuda.Event()
+                copied.record(stream)
+            if pending is not None:
+                yield self._wait_for_copy(*pending)
+            pending = (batch, copied)
+        if pending is not None:
+            yield self._wait_for_copy(*pending)
+
+    def _wait_for_copy(self, batch, copied):
+        current_stream = torch.cuda.current_stream(self.gpu)
+        current_stream.wait_event(copied)
+        self._record_stream(batch, current_stream)
+        return batch
+
+    def _record_stream(self, batch, stream):
+        if isinstance(batch, dict):
+            for value in batch.values():
+                self._record_stream(value, stream)
+        elif isinstance(batch, (list, tuple)):
+            for item in batch:
+                self._record_stream(item, stream)
+        elif hasattr(batch, "record_stream"):
+            batch.record_stream(stream)
+
     def __len__(self):
+        if self.streaming:
+            # Each worker streams its own shards and ends on a partial
+            # batch.
+            num_workers = 1
+            if self._streaming_uses_workers():
+                num_workers = max(1, self.num_workers)
+            return sum(ceil(size / self.batch_size)
+                       for size in self.dataset.worker_sizes(
+                           self._epoch, num_workers))
+        if self.persistent_workers:
+            return self.batch_sampler.num_batches(self._epoch)
+        if self.uses_batch_sampler:
+            return len(self.batch_sampler)
         return ceil(len(self.dataset) / self.batch_size)
 
-    def batch2gpu(self, batch):
+    def batch2gpu(self, batch, non_blocking=False):
         if isinstance(batch, dict):
             for key, value in batch.items():
-                batch[key] = self.batch2gpu(value)
+                batch[key] = self.batch2gpu(value, non_blocking=non_blocking)
             return batch
         elif isinstance(batch, list):
-            return [self.batch2gpu(item) for item in batch] 
+            return [self.batch2gpu(item, non_blocking=non_blocking)
+                    for item in batch] 
         elif isinstance(batch, tuple):
-            return tuple([self.batch2gpu(item) for item in batch])
+            return tuple([self.batch2gpu(item, non_blocking=non_blocking)
+                          for item in batch])
         elif hasattr(batch, "cuda"):
-            return batch.cuda(self.gpu)
+            return batch.cuda(self.gpu, non_blocking=non_blocking)
         else:
             return batch
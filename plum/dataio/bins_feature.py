@@ -1,30 +1,54 @@
 from plum.types import register, PlumObject, HP
+from bisect import bisect_left
+import numpy as np
 
 
 @register("dataio.pipeline.threshold_feature")
 class ThresholdFeature(PlumObject):
 
+    # Maps a value to the index of the first threshold >= value, or
+    # len(thresholds) if there is none. For sorted thresholds this is the
+    # number of thresholds strictly less than the value, so values equal to
+    # a threshold fall in that threshold's bin.
+
     thresholds = HP()
 
+    def __pluminit__(self, thresholds):
+        self._thresholds = np.array(thresholds)
+        self._sorted = all(a <= b for a, b in zip(thresholds, thresholds[1:]))
+
     def __len__(self):
         return len(self.thresholds) + 1
 
     def __call__(self, value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return self.bin_many(value)
+        return self.bin(value)
+
+    def bin(self, value):
         if not isinstance(value, (int, float)):
             raise Exception("Expecting numerical values, int or float.")
-        # this should be a binary search but I'm tired.
+        if self._sorted:
+            return bisect_left(self.thresholds, value)
+
         bin = 0
-        
         while bin != len(self.thresholds) and value > self.thresholds[bin]:
             bin += 1
-
-#        if bin == 0:
-#            print(value, self.thresholds[bin])
-#        elif bin == len(self.thresholds):
-#            print(self.thresholds[bin-1], vaulue)
-#        else:
-#            print(self.thresholds[bin-1], value, self.thresholds[bin])
-        
         return bin
 
+    def bin_many(self, values):
+        # Bins for a list or array of values as an int64 array.
+        values = np.asarray(values)
+        if values.dtype.kind not in "biuf":
+            raise Exception("Expecting numerical values, int or float.")
 
+        if self._sorted:
+            bins = np.searchsorted(self._thresholds, values, side="left")
+        else:
+            above = values[..., None] <= self._thresholds
+            bins = np.where(above.any(axis=-1), above.argmax(axis=-1),
+                            len(self.thresholds))
+        # NaN is never greater than a threshold, so it falls in bin 0.
+        if values.dtype.kind == "f":
+            bins[np.isnan(values)] = 0
+        return bins.astype(np.int64)
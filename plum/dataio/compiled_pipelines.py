@@ -0,0 +1,188 @@
+from ..types import register, PlumObject, HP, props
+from ..types.plum_object import _to_json_helper
+from ..utils import resolve_getters
+from pathlib import Path
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+
+
+# A compiled shard is a directory holding one column per pipeline plus a
+# meta.json. Tensor valued pipelines are stored as a raw data file (all
+# examples concatenated along dim 0) and an int64 offsets file with
+# num_examples + 1 entries, so example i is data[offsets[i]:offsets[i+1]].
+# All other values (e.g. reference strings) are stored the same way as
+# utf8 encoded json. meta.json is written last and its signature covers the
+# pipeline configuration and the source files, so an interrupted or stale
+# compile is redone on the next load.
+META_NAME = "meta.json"
+
+
+def _source_signature(dataset):
+    # Compiled data is keyed by the source files' size and mtime rather than
+    # a sampled content fingerprint, so any edit to the data recompiles it.
+    sources = []
+    for path in getattr(dataset, "paths", []):
+        stat = os.stat(str(path))
+        sources.append(
+            [str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns])
+    return sources
+
+def pipelines_signature(dataset, pipelines):
+    config = {
+        "pipelines": _to_json_helper(pipelines),
+        "sources": _source_signature(dataset),
+        "size": len(dataset),
+    }
+    canonical_json = json.dumps(config, sort_keys=True, default=repr)
+    return hashlib.md5(canonical_json.encode("utf8")).hexdigest()
+
+def _column_files(directory, column):
+    return (directory / "{}.data".format(column),
+            directory / "{}.offsets".format(column))
+
+def compile_pipelines(dataset, pipelines, path, verbose=False):
+
+    directory = Path(path)
+    directory.mkdir(exist_ok=True, parents=True)
+    meta_path = directory / META_NAME
+    if meta_path.exists():
+        meta_path.unlink()
+
+    names = sorted(pipelines)
+    fields = {}
+    data_fps = {}
+    offsets = {}
+    for column, name in enumerate(names):
+        data_path, _ = _column_files(directory, column)
+        fields[name] = {"column": column, "kind": None}
+        data_fps[name] = open(str(data_path), "wb")
+        offsets[name] = [0]
+
+    try:
+        for index in range(len(dataset)):
+            item = dataset[index]
+            for name in names:
+                value = resolve_getters(pipelines[name], item)
+                field = fields[name]
+                if isinstance(value, torch.Tensor):
+                    kind = "tensor"
+                    if value.dim() == 0:
+                        raise ValueError(
+                            "Cannot compile 0-d tensor in pipeline {}".format(
+                                name))
+                    array = value.detach().cpu().contiguous().numpy()
+                    meta = {"dtype": str(array.dtype),
+                            "shape": list(array.shape[1:])}
+                    size = array.shape[0]
+                    raw_bytes = array.tobytes()
+                else:
+                    kind = "json"
+                    meta = {}
+                    raw_bytes = json.dumps(value).encode("utf8")
+                    size = len(raw_bytes)
+
+                if field["kind"] is None:
+                    field["kind"] = kind
+                    field.update(meta)
+                elif field["kind"] != kind or \
+                        any(field[k] != v for k, v in meta.items()):
+                    raise RuntimeError(
+                        "Pipeline {} produced inconsistent values at " \
+                        "example {}.".format(name, index))
+
+                data_fps[name].write(raw_bytes)
+                offsets[name].append(offsets[name][-1] + size)
+
+            if verbose and (index + 1) % 10000 == 0:
+                print("compiled {}/{} examples".format(
+                    index + 1, len(dataset)), end="\r", flush=True)
+    finally:
+        for fp in data_fps.values():
+            fp.close()
+
+    for name in names:
+        _, offsets_path = _column_files(directory, fields[name]["column"])
+        np.array(offsets[name], dtype=np.int64).tofile(str(offsets_path))
+
+    meta = {
+        "signature": pipelines_signature(dataset, pipelines),
+        "size": len(dataset),
+        "fields": fields,
+    }
+    meta_path.write_text(json.dumps(meta, sort_keys=True))
+    if verbose:
+        print("compiled {} examples to {}".format(len(dataset), directory))
+    return meta
+
+
+@register("dataio.compiled_pipelines")
+class CompiledPipelines(PlumObject):
+
+    dataset = HP()
+    pipelines = HP()
+    path = HP(type=props.STRING)
+    verbose = HP(default=False, type=props.BOOLEAN)
+
+    def __pluminit__(self, dataset, pipelines, path, verbose):
+        directory = Path(path)
+        meta_path = directory / META_NAME
+        signature = pipelines_signature(dataset, pipelines)
+        meta = None
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta["signature"] != signature:
+                meta = None
+
+        if meta is None:
+            meta = compile_pipelines(dataset, pipelines, path,
+                                     verbose=verbose)
+
+        self._size = meta["size"]
+        self._fields = meta["fields"]
+        self._columns = {}
+        for name, field in self._fields.items():
+            data_path, offsets_path = _column_files(
+                directory, field["column"])
+            offsets = np.fromfile(str(offsets_path), dtype=np.int64)
+            dtype = field["dtype"] if field["kind"] == "tensor" else np.uint8
+            if offsets[-1] == 0:
+                data = np.zeros((0,), dtype=dtype)
+            else:
+                # Copy-on-write mapping, so tensors built on top of it are
+                # writable but never modify the shard on disk.
+                data = np.memmap(str(data_path), dtype=dtype, mode="c")
+            if field["kind"] == "tensor":
+                data = data.reshape([-1] + field["shape"])
+            self._columns[name] = (data, offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("datasource index out of range")
+
+        item = {}
+        for name, field in self._fields.items():
+            data, offsets = self._columns[name]
+            start, stop = offsets[index], offsets[index + 1]
+            if field["kind"] == "tensor":
+                item[name] = torch.from_numpy(data[start:stop])
+            else:
+                item[name] = json.loads(data[start:stop].tobytes().decode(
+                    "utf8"))
+        return item
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return "dataio.CompiledPipelines({}, {} examples)".format(
+            self.path, len(self))
+
+    @property
+    def paths(self):
+        return self.dataset.paths
@@ -9,20 +9,52 @@ class CSV(PlumObject):
     path = HP(type=props.EXISTING_PATH)
     sep = HP(type=props.STRING)
     header = HP(type=props.BOOLEAN)
+    usecols = HP(required=False)
+    chunksize = HP(default=0, type=props.INTEGER)
 
     @property
     def header_names(self):
         return self._header_names
 
-    def __pluminit__(self, path):
+    def __pluminit__(self, path, usecols, chunksize):
+        # Rows are served from a columnar store of python lists built once
+        # at load time, rather than from the DataFrame. Only usecols are
+        # parsed if given, and with chunksize > 0 the file is parsed
+        # chunksize rows at a time so the whole DataFrame is never held in
+        # memory (numeric upcasting of rows then happens per chunk).
         header = 'infer' if self.header else None
-        self._dataframe = pd.read_csv(path, sep=self.sep, header=header)
+        if chunksize > 0:
+            frames = pd.read_csv(path, sep=self.sep, header=header,
+                                 usecols=usecols, chunksize=chunksize)
+        else:
+            frames = [pd.read_csv(path, sep=self.sep, header=header,
+                                  usecols=usecols)]
+
+        self._header_names = None
+        self._columns = None
+        for frame in frames:
+            if self._columns is None:
+                self._header_names = list(frame.columns)
+                self._columns = [[] for _ in self._header_names]
+            for column, values in zip(self._columns, _frame_columns(frame)):
+                column.extend(values)
+        if self._columns is None:
+            self._header_names = []
+            self._columns = []
+        self._size = len(self._columns[0]) if self._columns else 0
 
     def __getitem__(self, index):
-        return self._dataframe.iloc[index].to_dict()
+        return {name: column[index]
+                for name, column in zip(self._header_names, self._columns)}
+
+    def get_many(self, indices):
+        names = self._header_names
+        columns = self._columns
+        return [{name: column[index] for name, column in zip(names, columns)}
+                for index in indices]
 
     def __len__(self):
-        return len(self._dataframe)
+        return self._size
 
     def __repr__(self):
         return "dataio.CSV({}, header={}, sep='{}', {} rows)".format(
@@ -31,3 +63,14 @@ class CSV(PlumObject):
     @property
     def paths(self):
         return [self.path]
+
+
+def _frame_columns(frame):
+    # Column values as python lists, with the same values and types that
+    # frame.iloc[index].to_dict() gives: a row of a frame with only numeric
+    # columns is upcast to their common dtype (e.g. ints become floats next
+    # to a float column), otherwise values keep their column's type.
+    values = frame.to_numpy()
+    if values.dtype != object:
+        return [values[:, j].tolist() for j in range(values.shape[1])]
+    return [frame[name].tolist() for name in frame.columns]
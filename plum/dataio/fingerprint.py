@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+import numpy as np
+
+
+# Files are fingerprinted by their size and 64 evenly spaced 64KB blocks
+# (the whole file if it is smaller than that), so the cost is bounded for
+# any file size and touching, copying, or moving a file does not change
+# its fingerprint. Since an edit between sampled blocks goes unnoticed, this
+# only keys the vocab cache; compiled data and cached lengths are keyed by
+# the source files' size and mtime.
+_FINGERPRINT_BLOCKS = 64
+_FINGERPRINT_BLOCK_SIZE = 1 << 16
+FINGERPRINT_SIZE = 16
+
+# Datasources that are not backed by files are fingerprinted by their
+# length and up to this many evenly spaced items.
+_FINGERPRINT_ITEMS = 1024
+
+
+def file_fingerprint(path):
+    size = os.stat(str(path)).st_size
+    md5 = hashlib.md5(str(size).encode("utf8"))
+    with open(str(path), "rb") as fp:
+        if size <= _FINGERPRINT_BLOCKS * _FINGERPRINT_BLOCK_SIZE:
+            md5.update(fp.read())
+        else:
+            starts = np.linspace(0, size - _FINGERPRINT_BLOCK_SIZE,
+                                 _FINGERPRINT_BLOCKS).astype(np.int64)
+            for start in starts.tolist():
+                fp.seek(start)
+                md5.update(fp.read(_FINGERPRINT_BLOCK_SIZE))
+    return md5.digest()
+
+def _update_dataset_fingerprint(md5, dataset):
+    try:
+        paths = dataset.paths
+    except AttributeError:
+        paths = None
+
+    if paths is not None:
+        for path in paths:
+            md5.update(file_fingerprint(path))
+    elif hasattr(dataset, "datasources"):
+        # e.g. a StackDatasource over sources without paths.
+        for ds in dataset.datasources:
+            _update_dataset_fingerprint(md5, ds)
+    else:
+        size = len(dataset)
+        md5.update(str(size).encode("utf8"))
+        num_items = min(size, _FINGERPRINT_ITEMS)
+        indices = np.linspace(0, size - 1, num_items).astype(np.int64)
+        for index in np.unique(indices).tolist():
+            md5.update(repr(dataset[index]).encode("utf8"))
+
+def dataset_fingerprint(dataset):
+    # Hex digest of a datasource's contents, computed from file
+    # fingerprints where the datasource (or its children) are backed by
+    # files, without ever iterating over the whole datasource.
+    md5 = hashlib.md5()
+    _update_dataset_fingerprint(md5, dataset)
+    return md5.hexdigest()
@@ -3,23 +3,99 @@ try:
     import ujson as json
 except ModuleNotFoundError:
     import json
+from collections import OrderedDict
+
+import numpy as np
+
+from .line_index import build_line_offsets
+from .projection import merge_projection, project
 
 
 @register("dataio.jsonl")
 class JSONL(PlumObject):
-    
+
     path = HP(type=props.EXISTING_PATH)
+    fields = HP(required=False)
+    compact = HP(default=False, type=props.BOOLEAN)
+    cache_size = HP(default=0, type=props.INTEGER)
+
+    def __pluminit__(self, path, fields, compact):
+        self._projection = None
+        if fields is not None:
+            self._projection = merge_projection(None, fields)
+
+        if compact:
+            # Keep the raw file in one bytes buffer with a [num_lines x 2]
+            # array of (start, stop) line offsets, and decode records on
+            # access. Memory stays close to the file size, and since
+            # neither object holds python references per record, forked
+            # DataLoader workers do not copy its pages. Up to cache_size
+            # decoded records are kept in an LRU cache.
+            with open(path, "rb") as fp:
+                self._buffer = fp.read()
+            self._offsets = build_line_offsets(self._buffer).astype(np.int64)
+            self._cache = OrderedDict()
+            self._data = None
+            return
 
-    def __pluminit__(self, path):
         self._data = []
         with open(path, "r") as fp:
             for line in fp:
-                self._data.append(json.loads(line))
+                self._data.append(project(json.loads(line), self._projection))
+
+    def add_projection(self, fields):
+        # Drop everything but the sub-objects at the given field paths from
+        # the loaded records. Repeated calls take the union of all fields,
+        # but fields dropped by an earlier projection cannot be recovered.
+        self._projection = merge_projection(self._projection, fields)
+        if self.compact:
+            self._cache.clear()
+            return
+        self._data = [project(item, self._projection) for item in self._data]
+
+    def _decode(self, index):
+        start, stop = self._offsets[index].tolist()
+        return project(json.loads(self._buffer[start:stop]), self._projection)
 
     def __getitem__(self, index):
-        return self._data[index]
+        if not self.compact:
+            return self._data[index]
+        if self.cache_size <= 0:
+            return self._decode(index)
+
+        if index < 0:
+            index += len(self)
+        item = self._cache.get(index, None)
+        if item is not None:
+            self._cache.move_to_end(index)
+            return item
+        item = self._decode(index)
+        self._cache[index] = item
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return item
+
+    def get_many(self, indices):
+        if not self.compact:
+            return [self._data[index] for index in indices]
+        if self.cache_size > 0:
+            return [self[index] for index in indices]
+
+        # Decode the lines, in file order, as a single json array.
+        offsets = self._offsets[np.asarray(indices, dtype=np.int64)]
+        offsets = offsets.reshape(-1, 2)
+        order = np.argsort(offsets[:, 0], kind="stable")
+        lines = [self._buffer[start:stop]
+                 for start, stop in offsets[order].tolist()]
+        data = json.loads(b"[" + b",".join(lines) + b"]")
+        items = [None] * len(data)
+        for position, item in zip(order.tolist(), data):
+            items[position] = project(item, self._projection)
+        return items
 
     def __len__(self):
+        if self.compact:
+            return len(self._offsets)
         return len(self._data)
 
     def __repr__(self):
@@ -28,4 +104,3 @@ class JSONL(PlumObject):
     @property
     def paths(self):
         return [self.path]
-
@@ -0,0 +1,150 @@
+import os
+import mmap
+from pathlib import Path
+from multiprocessing import Pool
+
+import numpy as np
+
+
+# Sidecar index layout: an 8 byte magic string followed by three uint64
+# header fields (data file size, data file mtime in ns, number of lines) and
+# then a packed [num_lines x 2] uint64 array of (start, stop) byte offsets.
+# stop is the position of the line's newline (or the file size for a final
+# line without one), i.e. line i is data[start:stop].
+INDEX_MAGIC = b"PLUMIDX1"
+INDEX_SUFFIX = ".offsets"
+_HEADER_FIELDS = 3
+_HEADER_SIZE = len(INDEX_MAGIC) + 8 * _HEADER_FIELDS
+
+# Newlines are located 64MB at a time, and files smaller than 256MB are
+# always scanned in a single process.
+_SCAN_CHUNK_SIZE = 1 << 26
+_MIN_PARALLEL_SCAN_SIZE = 1 << 28
+
+
+def index_path(path):
+    path = Path(path)
+    return path.parent / (path.name + INDEX_SUFFIX)
+
+def _file_signature(path):
+    stat = os.stat(str(path))
+    return stat.st_size, stat.st_mtime_ns
+
+def find_newlines(buf, start=0, stop=None):
+    # Positions of all b'\n' bytes in buf[start:stop], located chunk by chunk
+    # with numpy so there is no per-line python overhead.
+    if stop is None:
+        stop = len(buf)
+    positions = []
+    for chunk_start in range(start, stop, _SCAN_CHUNK_SIZE):
+        chunk_size = min(_SCAN_CHUNK_SIZE, stop - chunk_start)
+        chunk = np.frombuffer(buf, dtype=np.uint8, count=chunk_size,
+                              offset=chunk_start)
+        positions.append(
+            np.flatnonzero(chunk == 10).astype(np.uint64) + chunk_start)
+        # Release the view so the underlying mmap can be closed.
+        del chunk
+    if len(positions) == 0:
+        return np.zeros((0,), dtype=np.uint64)
+    return np.concatenate(positions)
+
+def _find_newlines_in_file(args):
+    path, start, stop = args
+    with open(path, "rb") as fp:
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return find_newlines(buf, start, stop)
+    finally:
+        buf.close()
+
+def build_line_offsets(buf, path=None, num_workers=1):
+    # When path is given and num_workers > 1, large files are split into
+    # num_workers byte ranges that are scanned in separate processes.
+    file_size = len(buf)
+    if path is not None and num_workers > 1 \
+            and file_size >= _MIN_PARALLEL_SCAN_SIZE:
+        bounds = np.linspace(0, file_size, num_workers + 1).astype(np.int64)
+        ranges = [(str(path), int(start), int(stop))
+                  for start, stop in zip(bounds[:-1], bounds[1:])]
+        with Pool(num_workers) as pool:
+            newlines = np.concatenate(
+                pool.map(_find_newlines_in_file, ranges))
+    else:
+        newlines = find_newlines(buf)
+
+    starts = np.zeros((newlines.shape[0],), dtype=np.uint64)
+    starts[1:] = newlines[:-1] + 1
+    offsets = np.stack([starts, newlines], axis=1)
+
+    # Keep the final line if the file does not end with a newline.
+    last_start = int(newlines[-1]) + 1 if newlines.shape[0] > 0 else 0
+    if last_start < file_size:
+        offsets = np.concatenate(
+            [offsets, np.array([[last_start, file_size]], dtype=np.uint64)])
+
+    return offsets
+
+def read_line_index(path):
+    # Returns None if the index is missing, malformed, or stale, i.e. the
+    # size or mtime of path differ from those recorded in the index header.
+    idx_path = index_path(path)
+    if not idx_path.exists():
+        return None
+
+    size, mtime = _file_signature(path)
+    with open(str(idx_path), "rb") as fp:
+        magic = fp.read(len(INDEX_MAGIC))
+        header = np.frombuffer(fp.read(8 * _HEADER_FIELDS), dtype=np.uint64)
+    if magic != INDEX_MAGIC or header.shape[0] != _HEADER_FIELDS:
+        return None
+    idx_size, idx_mtime, num_lines = [int(x) for x in header]
+    if idx_size != size or idx_mtime != mtime:
+        return None
+    if idx_path.stat().st_size != _HEADER_SIZE + 16 * num_lines:
+        return None
+    if num_lines == 0:
+        return np.zeros((0, 2), dtype=np.uint64)
+
+    return np.memmap(str(idx_path), dtype=np.uint64, mode="r",
+                     offset=_HEADER_SIZE, shape=(num_lines, 2))
+
+def write_line_index(path, offsets):
+    # Write to a temporary file and move it into place so concurrent readers
+    # never see a partial index. Returns False if the index could not be
+    # written, e.g. because the data directory is read only.
+    idx_path = index_path(path)
+    tmp_path = idx_path.parent / "{}.{}.tmp".format(
+        idx_path.name, os.getpid())
+    size, mtime = _file_signature(path)
+    header = np.array([size, mtime, offsets.shape[0]], dtype=np.uint64)
+    try:
+        with open(str(tmp_path), "wb") as fp:
+            fp.write(INDEX_MAGIC)
+            fp.write(header.tobytes())
+            fp.write(np.ascontiguousarray(offsets, dtype=np.uint64).tobytes())
+        os.replace(str(tmp_path), str(idx_path))
+    except OSError:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return False
+    return True
+
+def load_line_offsets(path, buf, use_cache=True, num_workers=1):
+    # buf holds the (memory-mapped) contents of path. Offsets are read from
+    # the sidecar index when it is up to date, otherwise they are computed
+    # from buf and the index is (re)written for the next load.
+    if use_cache:
+        offsets = read_line_index(path)
+        if offsets is not None:
+            return offsets
+
+    offsets = build_line_offsets(buf, path=path, num_workers=num_workers)
+
+    if use_cache and write_line_index(path, offsets):
+        # Reload through the index so the offsets live in the page cache
+        # rather than process memory, where they can be shared by
+        # forked dataloader workers.
+        cached = read_line_index(path)
+        if cached is not None:
+            return cached
+    return offsets
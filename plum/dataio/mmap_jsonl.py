@@ -5,42 +5,56 @@ except ModuleNotFoundError:
     import json
 import mmap
 import contextlib
+import numpy as np
+
+from .line_index import load_line_offsets
 
 
 @register("dataio.mmap_jsonl")
 class MMAPJSONL(PlumObject):
     
     path = HP(type=props.EXISTING_PATH)
+    cache_index = HP(default=True, type=props.BOOLEAN)
+    index_workers = HP(default=1, type=props.INTEGER)
     
-    def __pluminit__(self, path):
+    def __pluminit__(self, path, cache_index):
         with open(path, "r") as fp:
             self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
         self._offsets = self._build_byte_offsets()
 
     def _build_byte_offsets(self):
-        offsets = [] 
-        start = 0
-        stop = self._mmap.find(b'\n')
-        while stop != -1:
-            offsets.append([start, stop])
-            start = stop + 1
-            stop = self._mmap.find(b'\n', start)
-
-        file_size = self._mmap.size()
-        delta = int(file_size) - int(offsets[-1][-1] + 1)
-        if delta > 0:
-            offsets.append([offsets[-1][-1] + 1, file_size])
-
-        return offsets
+        # Offsets are a [num_lines x 2] uint64 array of (start, stop) byte
+        # positions, memory-mapped from a sidecar index file next to path
+        # when cache_index is true. Rebuilding the index scans the file in
+        # index_workers parallel processes.
+        return load_line_offsets(self.path, self._mmap,
+                                 use_cache=self.cache_index,
+                                 num_workers=self.index_workers)
 
     def __getitem__(self, index):
         start, stop = self._offsets[index]
-        size = stop - start
+        start = int(start)
+        size = int(stop) - start
         self._mmap.seek(start)
         raw_bytes = self._mmap.read(size)
         data = json.loads(raw_bytes.decode("utf8"))
         return data
 
+    def get_many(self, indices):
+        # Lines are sliced from the mmap in file order (no seek/read calls),
+        # joined into a single json array, and decoded with one json.loads
+        # before being put back in request order.
+        offsets = np.asarray(self._offsets[np.asarray(indices, dtype=np.int64)],
+                             dtype=np.int64).reshape(-1, 2)
+        order = np.argsort(offsets[:, 0], kind="stable")
+        lines = [self._mmap[start:stop]
+                 for start, stop in offsets[order].tolist()]
+        data = json.loads(b"[" + b",".join(lines) + b"]")
+        items = [None] * len(data)
+        for position, item in zip(order.tolist(), data):
+            items[position] = item
+        return items
+
     def __len__(self):
         return len(self._offsets)
 
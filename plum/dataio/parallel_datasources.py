@@ -15,9 +15,28 @@ class ParallelDatasources(PlumObject):
                     "Expected {} datapoints but found {} in {}".format(
                         len0, len(ds), str(ds)))
 
+    def add_projection(self, fields):
+        # Field paths start with the index of the datasource they read from.
+        # Datasources read as a whole are left unprojected.
+        for i, ds in enumerate(self.datasources):
+            ds_fields = [field[1:] for field in fields if field[0] == i]
+            if len(ds_fields) == 0 or any(len(f) == 0 for f in ds_fields):
+                continue
+            if hasattr(ds, "add_projection"):
+                ds.add_projection(ds_fields)
+
     def __getitem__(self, index):
         return [ds[index] for ds in self.datasources]
 
+    def get_many(self, indices):
+        columns = []
+        for ds in self.datasources:
+            if hasattr(ds, "get_many"):
+                columns.append(ds.get_many(indices))
+            else:
+                columns.append([ds[index] for index in indices])
+        return [list(item) for item in zip(*columns)]
+
     def __len__(self):
         return len(self.datasources[0])
 
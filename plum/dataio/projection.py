@@ -0,0 +1,49 @@
+# Helpers for projecting datasource records onto the fields a set of
+# pipelines actually read. A projection is a tree of dicts mapping field
+# names to sub-projections, where None means the whole sub-object is kept,
+# e.g. {"sequence": {"pos ptb": None}, "controls": None}.
+
+
+def getter_prefix(getters):
+    # The leading field lookups of a getter list, up to the first callable.
+    if not isinstance(getters, (list, tuple)):
+        getters = [getters]
+    prefix = []
+    for getter in getters:
+        if hasattr(getter, "__call__"):
+            break
+        prefix.append(getter)
+    return tuple(prefix)
+
+def pipeline_fields(pipelines):
+    # Field paths read by a collection of getter lists. Returns None if any
+    # getter starts with a callable, i.e. needs the whole item.
+    fields = set()
+    for getters in pipelines:
+        prefix = getter_prefix(getters)
+        if len(prefix) == 0:
+            return None
+        fields.add(prefix)
+    return sorted(fields, key=str)
+
+def merge_projection(projection, fields):
+    # Add field paths to projection and return the result, starting a new
+    # projection if projection is None. A path that is a prefix of another
+    # keeps the whole sub-object.
+    if projection is None:
+        projection = {}
+    for field in fields:
+        node = projection
+        for i, key in enumerate(field):
+            last = i + 1 == len(field)
+            if last or node.get(key, {}) is None:
+                node[key] = None
+                break
+            node = node.setdefault(key, {})
+    return projection
+
+def project(item, projection):
+    if projection is None or not isinstance(item, dict):
+        return item
+    return {key: project(item[key], sub_projection)
+            for key, sub_projection in projection.items() if key in item}
@@ -0,0 +1,200 @@
+from ..utils import resolve_getters
+from .compiled_pipelines import pipelines_signature
+from torch.utils.data import Sampler
+from pathlib import Path
+
+import numpy as np
+
+
+def compute_lengths(dataset, getters):
+    lengths = np.zeros((len(dataset),), dtype=np.int64)
+    for index in range(len(dataset)):
+        if getters is None:
+            lengths[index] = len(dataset[index])
+        else:
+            lengths[index] = resolve_getters(getters, dataset[index])
+    return lengths
+
+def lengths_cache_path(dataset, getters):
+    paths = getattr(dataset, "paths", [])
+    if len(paths) == 0:
+        return None
+    signature = pipelines_signature(dataset, {"lengths": getters})
+    path = Path(paths[0])
+    return path.parent / "{}.lengths-{}.npy".format(path.name, signature)
+
+def load_lengths(dataset, getters):
+    # Lengths of every item in dataset according to getters (or len(item)
+    # if getters is None). Computing them requires a full pass over the
+    # data, so they are cached in a .npy file next to the datasource's
+    # first path, keyed by the getters and the source files' size and mtime.
+    cache_path = lengths_cache_path(dataset, getters)
+    if cache_path is not None and cache_path.exists():
+        lengths = np.load(str(cache_path))
+        if lengths.shape[0] == len(dataset):
+            return lengths
+
+    lengths = compute_lengths(dataset, getters)
+    if cache_path is not None:
+        try:
+            np.save(str(cache_path), lengths)
+        except OSError:
+            pass
+    return lengths
+
+
+def pack_batches(indices, lengths, max_tokens):
+    # Greedily group indices, in order, into batches whose padded size
+    # stays within max_tokens. lengths is a [num_items x num_keys] array,
+    # e.g. source and target lengths, and the padded size of a batch is
+    # the number of items times the sum over keys of the longest item.
+    # An item that alone exceeds max_tokens gets a batch of its own.
+    lengths = lengths.tolist()
+    batches = []
+    batch = []
+    batch_max = [0] * len(lengths[0]) if len(lengths) > 0 else []
+    for index in indices.tolist():
+        item_lengths = lengths[index]
+        new_max = [max(x, y) for x, y in zip(batch_max, item_lengths)]
+        if len(batch) > 0 and sum(new_max) * (len(batch) + 1) > max_tokens:
+            batches.append(batch)
+            batch = []
+            new_max = item_lengths
+        batch.append(index)
+        batch_max = new_max
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+class PlannedBatchSampler(Sampler):
+
+    # Batch sampler that lays out a whole epoch of batches up front, with
+    # batch_size items per batch, or packed up to max_tokens padded tokens
+    # if max_tokens > 0. Plans are a function of seed and epoch only (a
+    # fresh random state is used if seed is None) and are kept until they
+    # are iterated, so __len__ or num_batches can look at an upcoming epoch
+    # and __iter__ will yield exactly that plan. The epoch advances each
+    # time a plan is iterated.
+
+    def __init__(self, num_items, batch_size, shuffle=True, max_tokens=0,
+                 token_lengths=None, seed=None):
+        self.num_items = num_items
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.max_tokens = max_tokens
+        if token_lengths is not None and token_lengths.ndim == 1:
+            token_lengths = token_lengths.reshape(-1, 1)
+        self.token_lengths = token_lengths
+        self.seed = seed
+        self.epoch = 0
+        self._plans = {}
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _random_state(self, epoch):
+        if self.seed is None:
+            return np.random.RandomState()
+        return np.random.RandomState([self.seed, epoch])
+
+    def _ordered_indices(self, random_state):
+        if self.shuffle:
+            return random_state.permutation(self.num_items)
+        return np.arange(self.num_items)
+
+    def _split_batches(self, indices):
+        if self.max_tokens > 0:
+            return pack_batches(indices, self.token_lengths, self.max_tokens)
+        return [indices[i:i + self.batch_size].tolist()
+                for i in range(0, len(indices), self.batch_size)]
+
+    def build_plan(self, epoch):
+        random_state = self._random_state(epoch)
+        return self._split_batches(self._ordered_indices(random_state))
+
+    def plan(self, epoch):
+        if epoch not in self._plans:
+            self._plans[epoch] = self.build_plan(epoch)
+        return self._plans[epoch]
+
+    def num_batches(self, epoch):
+        return len(self.plan(epoch))
+
+    def __iter__(self):
+        plan = self.plan(self.epoch)
+        del self._plans[self.epoch]
+        self.epoch += 1
+        for batch in plan:
+            yield batch
+
+    def __len__(self):
+        return self.num_batches(self.epoch)
+
+
+class TokenBudgetBatchSampler(PlannedBatchSampler):
+
+    # Batches are filled in (shuffled) dataset order up to max_tokens
+    # padded tokens, so short items share large batches and long items
+    # get small ones.
+
+    def __init__(self, token_lengths, max_tokens, shuffle=True, seed=None):
+        super(TokenBudgetBatchSampler, self).__init__(
+            token_lengths.shape[0], None, shuffle=shuffle,
+            max_tokens=max_tokens, token_lengths=token_lengths, seed=seed)
+
+
+class BucketBatchSampler(PlannedBatchSampler):
+
+    # Yields batches of dataset indices whose lengths are close together.
+    # Lengths are quantized into buckets of bucket_width; items are shuffled
+    # within a bucket, buckets are laid out from shortest to longest and cut
+    # into batches, and then the order of the batches is shuffled. If
+    # max_tokens > 0, batches are packed up to max_tokens padded tokens
+    # (measured with token_lengths, which default to lengths), otherwise
+    # they hold batch_size items.
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_width=1,
+                 max_tokens=0, token_lengths=None, seed=None):
+        if token_lengths is None:
+            token_lengths = lengths
+        super(BucketBatchSampler, self).__init__(
+            lengths.shape[0], batch_size, shuffle=shuffle,
+            max_tokens=max_tokens, token_lengths=token_lengths, seed=seed)
+        self.lengths = lengths
+        self.bucket_width = bucket_width
+
+    def _ordered_indices(self, random_state):
+        buckets = self.lengths // self.bucket_width
+        indices = super(BucketBatchSampler, self)._ordered_indices(
+            random_state)
+        # Stable sort keeps the shuffled order within each bucket.
+        return indices[np.argsort(buckets[indices], kind="stable")]
+
+    def build_plan(self, epoch):
+        random_state = self._random_state(epoch)
+        batches = self._split_batches(self._ordered_indices(random_state))
+        if self.shuffle:
+            order = random_state.permutation(len(batches))
+            batches = [batches[i] for i in order]
+        return batches
+
+
+class EpochBatchSampler(Sampler):
+
+    # Chains the epochs of a PlannedBatchSampler into one endless stream of
+    # batches, so a single DataLoader iterator (and its worker processes)
+    # can serve every epoch. Consumers take num_batches(epoch) batches per
+    # epoch.
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+
+    def __iter__(self):
+        while True:
+            empty = True
+            for batch in self.sampler:
+                empty = False
+                yield batch
+            if empty:
+                return
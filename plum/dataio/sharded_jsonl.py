@@ -0,0 +1,138 @@
+from ..types import register, PlumObject, HP, props
+try:
+    import ujson as json
+except ModuleNotFoundError:
+    import json
+from glob import glob
+import mmap
+
+import numpy as np
+
+from .line_index import load_line_offsets
+
+try:
+    from torch.utils.data import IterableDataset, get_worker_info
+except ImportError:
+    # torch < 1.2 has no iterable datasets, and Batches streams these
+    # datasources in the main process instead.
+    IterableDataset = object
+
+    def get_worker_info():
+        return None
+
+
+@register("dataio.sharded_jsonl")
+class ShardedJSONL(PlumObject, IterableDataset):
+
+    # Iterable datasource over many jsonl shards that never holds more
+    # than shuffle_buffer records in memory. Each epoch streams the shards
+    # in a shuffled order (seeded by seed and the epoch) and passes records
+    # through a shuffle buffer of shuffle_buffer records. DataLoader
+    # workers each read a disjoint subset of the shards. shards is a list
+    # of paths or glob patterns.
+
+    streaming = True
+
+    shards = HP()
+    shuffle = HP(default=True, type=props.BOOLEAN)
+    shuffle_buffer = HP(default=10000, type=props.INTEGER)
+    seed = HP(required=False)
+
+    def __pluminit__(self, shards, seed):
+        if not isinstance(shards, (list, tuple)):
+            shards = [shards]
+        self._paths = []
+        for pattern in shards:
+            matches = sorted(glob(pattern))
+            if len(matches) == 0:
+                raise ValueError("No shards match {}".format(pattern))
+            self._paths.extend(matches)
+
+        # Every worker must see the same shard order, so an unseeded
+        # datasource draws its seed once, here.
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        self._seed = seed
+        self._epoch = 0
+        self._shard_sizes = None
+
+    def set_epoch(self, epoch):
+        self._epoch = epoch
+
+    @property
+    def shard_sizes(self):
+        # Number of records per shard, counted from the (cached) line
+        # offset index of each shard.
+        if self._shard_sizes is None:
+            sizes = []
+            for path in self._paths:
+                with open(path, "r") as fp:
+                    buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    sizes.append(len(load_line_offsets(path, buf)))
+                finally:
+                    buf.close()
+            self._shard_sizes = sizes
+        return self._shard_sizes
+
+    def shard_order(self, epoch):
+        if not self.shuffle:
+            return list(range(len(self._paths)))
+        random_state = np.random.RandomState([self._seed, epoch])
+        return random_state.permutation(len(self._paths)).tolist()
+
+    def worker_shards(self, epoch, worker_id=0, num_workers=1):
+        return self.shard_order(epoch)[worker_id::num_workers]
+
+    def worker_sizes(self, epoch, num_workers=1):
+        # Number of records each of num_workers workers reads in epoch.
+        sizes = self.shard_sizes
+        return [sum(sizes[shard]
+                    for shard in self.worker_shards(epoch, worker_id,
+                                                    num_workers))
+                for worker_id in range(num_workers)]
+
+    def read_shard(self, path):
+        with open(path, "rb") as fp:
+            for line in fp:
+                yield json.loads(line)
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        if worker_info is None:
+            worker_id, num_workers = 0, 1
+        else:
+            worker_id, num_workers = worker_info.id, worker_info.num_workers
+
+        shards = self.worker_shards(self._epoch, worker_id, num_workers)
+        records = (record for shard in shards
+                   for record in self.read_shard(self._paths[shard]))
+        if not self.shuffle or self.shuffle_buffer <= 1:
+            for record in records:
+                yield record
+            return
+
+        random_state = np.random.RandomState(
+            [self._seed, self._epoch, worker_id])
+        buffer = []
+        for record in records:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(record)
+                continue
+            i = random_state.randint(self.shuffle_buffer)
+            yield buffer[i]
+            buffer[i] = record
+        random_state.shuffle(buffer)
+        for record in buffer:
+            yield record
+
+    def __len__(self):
+        return sum(self.shard_sizes)
+
+    def __repr__(self):
+        return "dataio.ShardedJSONL({} shards, {} lines)".format(
+            len(self._paths), len(self))
+
+    @property
+    def paths(self):
+        return list(self._paths)
@@ -1,35 +1,70 @@
 from ..types import register, PlumObject, HP, props
+from bisect import bisect_right
+
+import numpy as np
 
 
 @register("dataio.stack_ds")
 class StackDatasource(PlumObject):
-   
+
     datasources = HP()
 
+    def __pluminit__(self):
+        self.refresh()
 
-    def __getitem__(self, index):
+    def refresh(self):
+        # Cumulative lengths of the datasources are computed once. Call
+        # this if a child datasource changes length.
+        self._offsets = [0]
+        for ds in self.datasources:
+            self._offsets.append(self._offsets[-1] + len(ds))
 
+    def add_projection(self, fields):
+        for ds in self.datasources:
+            if hasattr(ds, "add_projection"):
+                ds.add_projection(fields)
+
+    def _locate(self, index):
         if index < 0:
             if -index > len(self):
                 raise IndexError("datasource index out of range")
             index = len(self) + index
+        if index >= len(self):
+            raise IndexError("datasource index out of range")
+        # Empty datasources share an offset with their successor, so
+        # bisect_right skips past them.
+        i = bisect_right(self._offsets, index) - 1
+        return i, index - self._offsets[i]
 
-        i = 0
-        n = 0 
-        offset = 0
-        while i < len(self.datasources):
+    def __getitem__(self, index):
+        i, local_index = self._locate(index)
+        return self.datasources[i][local_index]
 
-            n += len(self.datasources[i])
+    def get_many(self, indices):
+        # Items at indices, in order. Requests are grouped by datasource so
+        # each one is asked once, through its own get_many if it has one.
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        size = len(self)
+        if np.any((indices < -size) | (indices >= size)):
+            raise IndexError("datasource index out of range")
+        indices = np.where(indices < 0, indices + size, indices)
+        sources = np.searchsorted(self._offsets, indices, side="right") - 1
 
-            if index < n:
-                return self.datasources[i][index - offset]
-            
-            i += 1
-            offset = n
-        raise IndexError("datasource index out of range")
+        items = [None] * len(indices)
+        for i in np.unique(sources).tolist():
+            positions = np.flatnonzero(sources == i)
+            local_indices = (indices[positions] - self._offsets[i]).tolist()
+            ds = self.datasources[i]
+            if hasattr(ds, "get_many"):
+                ds_items = ds.get_many(local_indices)
+            else:
+                ds_items = [ds[index] for index in local_indices]
+            for position, item in zip(positions.tolist(), ds_items):
+                items[position] = item
+        return items
 
     def __len__(self):
-        return sum([len(ds) for ds in self.datasources])
+        return self._offsets[-1]
 
     @property
     def paths(self):
@@ -0,0 +1,30 @@
+from plum.types import register, PlumObject, HP
+import numpy as np
+import torch
+
+
+@register("dataio.pipeline.threshold_features")
+class ThresholdFeatures(PlumObject):
+
+    # Bins several numeric fields of an item against one shared, sorted
+    # list of thresholds, producing a [len(fields)] LongTensor. Each bin
+    # matches ThresholdFeature, i.e. the number of thresholds strictly
+    # less than the value.
+
+    fields = HP()
+    thresholds = HP()
+
+    def __pluminit__(self, thresholds):
+        self._thresholds = np.array(thresholds)
+
+    def __len__(self):
+        return len(self.thresholds) + 1
+
+    def __call__(self, item):
+        values = np.array([item[field] for field in self.fields])
+        if values.dtype.kind not in "iuf":
+            raise Exception("Expecting numerical values, int or float.")
+        bins = np.searchsorted(self._thresholds, values, side="left")
+        if values.dtype.kind == "f":
+            bins[np.isnan(values)] = 0
+        return torch.from_numpy(bins.astype(np.int64))
@@ -10,4 +10,4 @@ class VocabLookup(PlumObject):
     def __call__(self, item):
         if not isinstance(item, (list, tuple)):
             item = [item]
-        return torch.LongTensor([self.vocab[token] for token in item])
+        return torch.from_numpy(self.vocab.lookup_many(item))
@@ -1,7 +1,92 @@
 from ..types import register, PlumObject, HP, props
 from ..vocab import Vocab
+from ..utils import resolve_getters
 
 from collections import Counter
+import multiprocessing
+
+
+# Datasets smaller than this are always counted in a single process.
+_MIN_PARALLEL_COUNT_SIZE = 10000
+# Number of index ranges per worker, so progress can be reported and
+# uneven ranges balance out.
+_RANGES_PER_WORKER = 8
+
+# Dataset and pipelines of the counting pass in progress. Worker processes
+# are forked and inherit them, since plum objects cannot be pickled.
+_COUNT_JOB = None
+
+
+def _count_items(items, pipelines):
+    counts = {name: Counter() for name in pipelines}
+    num_items = 0
+    for item in items:
+        for name, pipeline in pipelines.items():
+            tokens = resolve_getters(pipeline, item)
+            if not isinstance(tokens, (list, tuple)):
+                tokens = [tokens]
+            counts[name].update(tokens)
+        num_items += 1
+    return num_items, counts
+
+def _count_range(bounds):
+    dataset, pipelines = _COUNT_JOB
+    return _count_items(
+        (dataset[index] for index in range(*bounds)), pipelines)
+
+def _count_shard(path):
+    dataset, pipelines = _COUNT_JOB
+    return _count_items(dataset.read_shard(path), pipelines)
+
+def count_tokens(dataset, pipelines, num_workers=1, verbose=False):
+    # Count the tokens produced by each of a dict of pipelines in a single
+    # pass over dataset, returning a dict of Counters. With num_workers > 1
+    # the dataset is split into contiguous index ranges (i.e. contiguous
+    # byte ranges of memory-mapped jsonl files) that are counted in forked
+    # processes and then merged. Streaming datasources are counted one
+    # shard per task.
+    global _COUNT_JOB
+
+    size = len(dataset)
+    if "fork" not in multiprocessing.get_all_start_methods() \
+            or size < _MIN_PARALLEL_COUNT_SIZE:
+        num_workers = 1
+    if getattr(dataset, "streaming", False):
+        count_task = _count_shard
+        tasks = dataset.paths
+    else:
+        count_task = _count_range
+        num_ranges = max(1, num_workers * _RANGES_PER_WORKER)
+        tasks = [(size * i // num_ranges, size * (i + 1) // num_ranges)
+                 for i in range(num_ranges)]
+
+    counts = {name: Counter() for name in pipelines}
+    _COUNT_JOB = (dataset, pipelines)
+    try:
+        if num_workers > 1:
+            pool = multiprocessing.get_context("fork").Pool(num_workers)
+            results = pool.imap_unordered(count_task, tasks)
+        else:
+            pool = None
+            results = map(count_task, tasks)
+
+        counted = 0
+        for num_items, range_counts in results:
+            for name, range_counter in range_counts.items():
+                counts[name].update(range_counter)
+            counted += num_items
+            if verbose:
+                print("counted tokens in {}/{} examples".format(
+                    counted, size), end="\r", flush=True)
+        if verbose:
+            print()
+    finally:
+        _COUNT_JOB = None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return counts
 
 
 @register("dataio.vocab_reader")
@@ -15,24 +100,20 @@ class VocabReader(PlumObject):
     pad_token = HP(required=False, type=props.STRING)
     top_k = HP(required=False, type=props.INTEGER)
     at_least = HP(default=0, type=props.INTEGER)
-    
-    def __new__(cls, *args, **kwargs):
 
-        counts = Counter()
-        for item in kwargs["dataset"]:
-            for pipe in kwargs["pipeline"]:
-                if hasattr(pipe, "__call__"):
-                    item = pipe(item)
-                else:
-                    item = item[pipe]
-            if not isinstance(item, (list, tuple)):
-                item = [item]
-            counts.update(item)
+    def __new__(cls, *args, **kwargs):
+        counts = count_tokens(
+            kwargs["dataset"], {"vocab": kwargs["pipeline"]})["vocab"]
+        return VocabReader.from_counts(counts, **kwargs)
 
+    @staticmethod
+    def from_counts(counts, **kwargs):
+        # Build the vocab described by VocabReader arguments kwargs from
+        # precomputed token counts.
         return Vocab.from_counts(
-            counts, 
-            start=kwargs.get("start_token", None),  
-            stop=kwargs.get("stop_token", None), 
+            counts,
+            start=kwargs.get("start_token", None),
+            stop=kwargs.get("stop_token", None),
             unk=kwargs.get("unknown_token", None),
             pad=kwargs.get("pad_token", None),
             at_least=kwargs.get("at_least", None),
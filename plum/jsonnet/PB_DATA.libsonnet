@@ -1,19 +1,36 @@
 
 
 local data = {
-    csv(path, header=true, sep=",", name=null): {
+    csv(path, header=true, sep=",", name=null, usecols=null, chunksize=0): {
         __plum_type__: "dataio.csv",
         __plum_datasource__: if name != null then name else path,
         path: path,
         header: header,
         sep: sep,
+        usecols: usecols,
+        chunksize: chunksize,
     },
 
-    jsonl(path, mmap=false, name=null): {
+    jsonl(path, mmap=false, name=null, fields=null, compact=false,
+          cache_size=0): {
 
         __plum_type__: if mmap then "dataio.mmap_jsonl" else "dataio.jsonl",
         __plum_datasource__: if name != null then name else path,
         path: path,
+    } + if mmap then {} else {
+        fields: fields,
+        compact: compact,
+        cache_size: cache_size,
+    },
+
+    sharded_jsonl(shards, name, shuffle=true, shuffle_buffer=10000,
+                  seed=null): {
+        __plum_type__: "dataio.sharded_jsonl",
+        __plum_datasource__: name,
+        shards: shards,
+        shuffle: shuffle,
+        shuffle_buffer: shuffle_buffer,
+        seed: seed,
     },
 
     stack_ds(datasources, name) : {
@@ -21,6 +38,16 @@ local data = {
         __plum_datasource__: name,
         datasources: datasources,
     },
+    compiled(ds, pipelines, path, name=null): {
+        __plum_type__: "dataio.compiled_pipelines",
+        __plum_datasource__: if name != null then name else path,
+        dataset: ds,
+        pipelines: pipelines,
+        path: path,
+    },
+    compiled_pipelines(pipelines): {
+        [name]: [name] for name in std.objectFields(pipelines)
+    },
     parallel(datasources, name=null): {
         __plum_type__: "dataio.parallel_datasources",
         __plum_datasource__: if name != null then name else std.join(
@@ -30,7 +57,10 @@ local data = {
     
     batches(ds, batch_size=32, num_workers=1, shuffle=true, pipelines={},
             collate_funcs={}, sort=false, sort_key=null,
-            sort_descending=true): {
+            sort_descending=true, project_fields=false,
+            bucket_batches=false, bucket_width=1, max_tokens=0,
+            max_tokens_keys=null, seed=null, pin_memory=false,
+            prefetch=false, persistent_workers=false, prefetch_factor=2): {
         __plum_type__: "dataio.batches",
         __plum_pipeline__: ds.__plum_datasource__, 
         dataset: ds, 
@@ -42,6 +72,16 @@ local data = {
         sort: sort,
         sort_key: sort_key,
         sort_descending: sort_descending,
+        project_fields: project_fields,
+        bucket_batches: bucket_batches,
+        bucket_width: bucket_width,
+        max_tokens: max_tokens,
+        max_tokens_keys: max_tokens_keys,
+        seed: seed,
+        pin_memory: pin_memory,
+        prefetch: prefetch,
+        persistent_workers: persistent_workers,
+        prefetch_factor: prefetch_factor,
     },
 
     pipeline: {
@@ -86,6 +126,11 @@ local data = {
         },
         len(): {__plum_type__: "dataio.pipeline.len"},
         long_tensor(): {__plum_type__: "dataio.pipeline.long_tensor"},
+        threshold_features(fields, thresholds): {
+            __plum_type__: "dataio.pipeline.threshold_features",
+            fields: fields,
+            thresholds: thresholds,
+        },
     },
 
 };
@@ -13,7 +13,8 @@
     encoder_decoder(model_name, encoder_inputs=["source_inputs"], 
                     decoder_inputs=["target_inputs"],
                     encoder=null, decoder=null, initializers={},
-                    search_algos={}, controls=null, control_inputs=[]): {
+                    search_algos={}, controls=null, control_inputs=[],
+                    search_shortlist=null, fuse_searches=false): {
 
         __plum_model__: model_name,
         __plum_type__: "plum.models.encoder_decoder",
@@ -25,6 +26,7 @@
         decoder: decoder,
 
         search_algos: search_algos,
+        fuse_searches: fuse_searches,
 
         initializers: initializers,
     } + (
@@ -32,5 +34,10 @@
             {controls: controls, control_inputs: control_inputs}
         else 
             {}
+    ) + (
+        if search_shortlist != null then
+            {search_shortlist: search_shortlist}
+        else
+            {}
     ),
 }
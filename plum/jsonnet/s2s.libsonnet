@@ -118,6 +118,20 @@ local pipeline = data.pipeline;
                 },
         ),
     models: import 's2s.models.libsonnet',
+
+    // Decode time output shortlist for models.rnn(search_shortlist=...): 
+    // searches only score targets matching the source_inputs tokens, the 
+    // top_n most frequent targets and special tokens, falling back to the
+    // full vocab when that is more than max_fraction of it.
+    search_shortlist(source_vocab, target_vocab, source_inputs="source_inputs",
+                     top_n=2000, max_fraction=0.5) : {
+        __plum_type__: "seq2seq.search.vocab_shortlist",
+        source_vocab: source_vocab,
+        target_vocab: target_vocab,
+        source_inputs: source_inputs,
+        top_n: top_n,
+        max_fraction: max_fraction,
+    },
     metrics: {
         eval_script(path, search_fields, references_fields) : {
             __plum_type__: "metrics.seq2seq_eval_script",
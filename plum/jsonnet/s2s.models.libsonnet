@@ -34,7 +34,8 @@ local make_embeddings(emb_vocab, emb_size) = {
 {
     rnn(hidden_size, source_vocabs, target_vocab, rnn_cell="gru",
         num_layers=2, emb_sizes=null, encoder_inputs=["source_inputs"],
-        decoder_inputs="target_inputs", controls=null) : 
+        decoder_inputs="target_inputs", controls=null,
+        fused_controls=null, search_shortlist=null, fuse_searches=false) : 
         
         local src_emb_sizes = if emb_sizes != null then 
                 emb_sizes 
@@ -140,20 +141,32 @@ local make_embeddings(emb_vocab, emb_size) = {
 
         };
 
-        local control_inputs = if controls != null then
-            [field for field in std.objectFields(controls)]
+        // If fused_controls names a batch field holding all controls as a
+        // [batch x num_controls] tensor (see the threshold_features
+        // pipeline, with fields in std.objectFields(controls) order), the
+        // controls are embedded from that one field.
+        local control_inputs = if controls == null then
+            []
+        else if fused_controls != null then
+            [fused_controls]
         else
-            [];
+            [field for field in std.objectFields(controls)];
               
 
-        local control_module = if controls != null then
+        local control_module = if controls == null then
+            null
+        else if fused_controls != null then
+            {
+                __plum_type__: "layers.column_embeddings",
+                embeddings: [controls[field] 
+                             for field in std.objectFields(controls)],
+            }
+        else
             {
                 __plum_type__: "layers.zip",
                 modules: [controls[field] for field in control_inputs],
                 aggregate: {__plum_type__: "layers.concat", dim: 2},
-            }           
-        else
-            null;
+            };
 
         models.encoder_decoder(
             "s2s." + rnn_cell,
@@ -176,5 +189,7 @@ local make_embeddings(emb_vocab, emb_size) = {
             },
             control_inputs=control_inputs,
             controls=control_module,
+            search_shortlist=search_shortlist,
+            fuse_searches=fuse_searches,
         )
 }
@@ -14,3 +14,4 @@ from .seq_pool_1d import SeqPool1D
 from .seq_conv_pool_1d import SeqConvPool1D
 from .concat import Concat
 from .zip import Zip
+from .column_embeddings import ColumnEmbeddings
@@ -2,6 +2,7 @@ from plum.types import register, PlumModule, P, HP, SM, props, LazyDict,\
     Variable
 import torch
 from ..identity import Identity
+from ..functional import additive_scores
 
 
 def _curry_composition(attention, value, value_net):
@@ -18,26 +19,46 @@ class FeedForwardAttention(PlumModule):
     key_net = SM(default=Identity())
     value_net = SM(default=Identity())
     hidden_size = HP(type=props.INTEGER)
+    # Number of query positions scored at a time, see 
+    # functional.additive_scores. 
+    query_chunk_size = HP(default=4, type=props.INTEGER)
 
     weight = P("hidden_size", tags=["weight", "fully_connected"])
 
 
 
      
-    def forward(self, query, key, value=None):
+    def forward(self, query, key, value=None, cache=None):
         if value is None:
             value = key
 
         if isinstance(query, Variable):
-            return self._variable_forward(query, key, value)
+            if cache is None:
+                cache = self.precompute(key, value)
+            return self._variable_forward(query, cache)
         else:
             return self._tensor_forward(query, key, value)
+
+    def precompute(self, key, value=None):
+        # Compute everything that does not depend on the query: the 
+        # projected keys and values and the key padding mask. During search
+        # the keys are fixed, so this is done once and passed to forward as
+        # cache at every step.
+        if value is None:
+            value = key
+
+        key = self.key_net(key).permute_as_sequence_batch_features()
+        assert key.dim() == 3
+        with torch.no_grad():
+            key_valid = (~key.mask).float()
+
+        return {"key": key, "key_valid": key_valid,
+                "value": self.value_net(value)}
     
-    def _variable_forward(self, query, key, value):
-        key = self.key_net(key)
+    def _variable_forward(self, query, cache):
+        key = cache["key"]
         query = self.query_net(query)
 
-        key = key.permute_as_sequence_batch_features()
         query = query.permute_as_sequence_batch_features()
 
         assert key.dim() == query.dim() == 3
@@ -45,13 +66,10 @@ class FeedForwardAttention(PlumModule):
        
         with torch.no_grad():
             mask = ~torch.einsum("qbh,kbh->qkb", [(~query.mask).float(), 
-                                                  (~key.mask).float()]).byte()
+                                                  cache["key_valid"]]).byte()
         
-        query_uns = query.data.unsqueeze(query.length_dim + 1)
-        key_uns = key.data.unsqueeze(query.length_dim)
-
-        hidden = torch.tanh(key_uns + query_uns)
-        scores = hidden.matmul(self.weight)
+        scores = additive_scores(query.data, key.data, self.weight,
+                                 self.query_chunk_size)
 
         scores = scores.masked_fill(mask, float("-inf"))
 
@@ -60,7 +78,7 @@ class FeedForwardAttention(PlumModule):
 
         comp = torch.einsum(
             "ijk,kjh->ijh",
-            [attention, self.value_net(value).data])
+            [attention, cache["value"].data])
         comp = Variable(comp, lengths=query.lengths, length_dim=0, 
                         batch_dim=1)
 
@@ -71,11 +89,8 @@ class FeedForwardAttention(PlumModule):
         key = self.key_net(key)
         query = self.query_net(query)
 
-        key = key.unsqueeze(0)
-        query = query.unsqueeze(1)
-
-        hidden = torch.tanh(key + query)
-        scores = hidden.matmul(self.weight)
+        scores = additive_scores(query, key, self.weight,
+                                 self.query_chunk_size)
 
         attention_batch_last = torch.softmax(scores, dim=1)
         attention_batch_second = attention_batch_last.transpose(1, 2)
@@ -3,5 +3,8 @@ from ...types import register, PlumModule
 
 @register("layers.attention.none")
 class NoAttention(PlumModule):
-    def forward(self, query, key, value=None, prev_state=None):
+    def forward(self, query, key, value=None, prev_state=None, cache=None):
         return {"output": query, "attention": None}
+
+    def precompute(self, key, value=None):
+        return None
@@ -0,0 +1,52 @@
+from ..types import register, PlumModule, SM, Variable
+from .functional import dropout
+import torch
+import torch.nn.functional as F
+
+
+@register("layers.column_embeddings")
+class ColumnEmbeddings(PlumModule):
+
+    # Embeds a [batch x num_columns] LongTensor, e.g. the output of the
+    # threshold_features pipeline, where column i is looked up in
+    # embeddings[i]. The result is the concatenation of all embeddings as a
+    # [1 x batch x features] Variable, the same layout a layers.zip of
+    # per-field embeddings produces for length 1 inputs. When all
+    # embeddings share out_feats and dropout and have no pad index, this is
+    # done with a single lookup in the stacked embedding weights.
+
+    embeddings = SM()
+
+    def _fused(self):
+        out_feats = set(emb.out_feats for emb in self.embeddings)
+        dropouts = set(emb.dropout for emb in self.embeddings)
+        no_pad = all(emb.pad_index is None for emb in self.embeddings)
+        return len(out_feats) == 1 and len(dropouts) == 1 and no_pad
+
+    def forward(self, inputs):
+        # Models pass control inputs as a list of batch fields.
+        if isinstance(inputs, (list, tuple)):
+            assert len(inputs) == 1
+            inputs = inputs[0]
+        if isinstance(inputs, Variable):
+            inputs = inputs.data
+        batch_size = inputs.size(0)
+
+        if self._fused():
+            weights = [emb.weight for emb in self.embeddings]
+            offsets = [0]
+            for weight in weights[:-1]:
+                offsets.append(offsets[-1] + weight.size(0))
+            offsets = inputs.new_tensor(offsets).view(1, -1)
+            output = F.embedding(inputs + offsets, torch.cat(weights, 0))
+            output = dropout(output, p=self.embeddings[0].dropout,
+                             training=self.training)
+            output = output.view(batch_size, -1)
+        else:
+            output = torch.cat(
+                [emb(inputs[:, i]) for i, emb in enumerate(self.embeddings)],
+                1)
+
+        lengths = inputs.new_ones(batch_size)
+        return Variable(output.unsqueeze(0), lengths=lengths, length_dim=0,
+                        batch_dim=1)
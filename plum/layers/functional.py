@@ -1,4 +1,5 @@
 from plum.types import Variable
+import torch
 import torch.nn.functional as F
 
 
@@ -57,3 +58,57 @@ def seq_conv1d(input, weight, **kwargs):
     )
     return input.new_with_meta(output_data, lengths_data)
 
+
+class _AdditiveScores(torch.autograd.Function):
+    # scores[i, j, b] = tanh(query[i, b] + key[j, b]) . weight, computed 
+    # chunk_size query positions at a time. Only the inputs are saved, and
+    # backward recomputes the tanh chunk by chunk, so the (query length x 
+    # key length x batch x hidden) tensor is never held in full.
+
+    @staticmethod
+    def forward(ctx, query, key, weight, chunk_size):
+        ctx.save_for_backward(query, key, weight)
+        ctx.chunk_size = chunk_size
+        key = key.unsqueeze(0)
+        scores = [(key + query_chunk.unsqueeze(1)).tanh_().matmul(weight)
+                  for query_chunk in query.split(chunk_size, 0)]
+        return torch.cat(scores, 0)
+
+    @staticmethod
+    def backward(ctx, grad_scores):
+        query, key, weight = ctx.saved_tensors
+        grad_queries = []
+        grad_key = torch.zeros_like(key)
+        grad_weight = torch.zeros_like(weight)
+
+        chunks = zip(query.split(ctx.chunk_size, 0),
+                     grad_scores.split(ctx.chunk_size, 0))
+        for query_chunk, grad_chunk in chunks:
+            # Everything is done in place on the one chunk sized buffer.
+            hidden = (key.unsqueeze(0) + query_chunk.unsqueeze(1)).tanh_()
+            if ctx.needs_input_grad[2]:
+                grad_weight += hidden.view(-1, weight.size(0)).t()\
+                    .mv(grad_chunk.contiguous().view(-1))
+            # d tanh(x) / dx = 1 - tanh(x) ** 2
+            grad_hidden = hidden.mul_(hidden).neg_().add_(1)\
+                .mul_(grad_chunk.unsqueeze(3)).mul_(weight)
+            grad_queries.append(grad_hidden.sum(1))
+            grad_key += grad_hidden.sum(0)
+
+        grad_query = torch.cat(grad_queries, 0) \
+            if ctx.needs_input_grad[0] else None
+        if not ctx.needs_input_grad[1]:
+            grad_key = None
+        if not ctx.needs_input_grad[2]:
+            grad_weight = None
+        return grad_query, grad_key, grad_weight, None
+
+def additive_scores(query, key, weight, chunk_size=0):
+    # Additive (Bahdanau) attention scores of query (query length x batch x
+    # hidden) over key (key length x batch x hidden), as a (query length x
+    # key length x batch) tensor. Memory grows with chunk_size query
+    # positions rather than the full query length; chunk_size <= 0 scores
+    # all queries at once.
+    if chunk_size <= 0:
+        chunk_size = max(query.size(0), 1)
+    return _AdditiveScores.apply(query, key, weight, chunk_size)
@@ -1,8 +1,15 @@
-from ..types import register, PlumModule, HP, P, props, LazyDict
+from ..types import register, PlumModule, HP, P, props, LazyDict, \
+    Variable
 import torch
+from collections import namedtuple
 from .functional import linear
 
 
+# The rows of a LinearPredictor for a subset of its classes, see 
+# LinearPredictor.shortlist.
+Shortlist = namedtuple("Shortlist", ["indices", "weight", "bias"])
+
+
 @register("layers.linear_predictor")
 class LinearPredictor(PlumModule):
 
@@ -30,7 +37,64 @@ class LinearPredictor(PlumModule):
             return logits.log_softmax(dim=-1)
         return get_log_probs
 
-    def forward(self, inputs):
+    def shortlist(self, indices):
+        # Slice the projection to the classes in indices (a LongTensor) once,
+        # for use with forward(inputs, shortlist=...) over many steps.
+        bias = self.bias.index_select(0, indices) \
+            if self.bias is not None else None
+        return Shortlist(indices, self.weight.index_select(0, indices), bias)
+
+    def _curry_expand(self, get_values, indices, fill_value):
+        # Scatter the values from get_values() over the shortlist indices 
+        # into a tensor over all classes, filled with fill_value elsewhere.
+        def expand():
+            values = get_values()
+            data = values.data if isinstance(values, Variable) else values
+            dims = list(data.size())
+            dims[-1] = self.num_classes
+            full = data.new(*dims).fill_(fill_value)\
+                .index_copy_(len(dims) - 1, indices, data)
+            if isinstance(values, Variable):
+                return values.new_with_meta(full)
+            return full
+        return expand
+
+    def _curry_shortlist_output(self, logits, indices):
+        def get_output():
+            output = logits.argmax(-1)
+            if isinstance(output, Variable):
+                return output.new_with_meta(
+                    indices.index_select(0, output.data.view(-1))\
+                        .view(output.size()))
+            return indices.index_select(0, output.view(-1))\
+                .view(output.size())
+        return get_output
+
+    def _shortlist_forward(self, inputs, shortlist):
+        # Only the shortlisted classes are scored. Results keep the full 
+        # class dim, with -inf logits for all other classes, i.e. 
+        # probabilities are renormalized over the shortlist. The shortlist
+        # and log probs over its indices are also returned, for searches 
+        # that can use them directly.
+        logits = linear(inputs, shortlist.weight, shortlist.bias)
+        result = LazyDict()
+        result["shortlist"] = shortlist
+        result.lazy_set("shortlist_log_probs", self._curry_log_probs(logits))
+        result.lazy_set("target_logits", self._curry_expand(
+            lambda: logits, shortlist.indices, float("-inf")))
+        result.lazy_set("output", self._curry_shortlist_output(
+            logits, shortlist.indices))
+        result.lazy_set("probs", self._curry_expand(
+            self._curry_probs(logits), shortlist.indices, 0.))
+        result.lazy_set("log_probs", self._curry_expand(
+            lambda: result["shortlist_log_probs"], shortlist.indices, 
+            float("-inf")))
+        return result
+
+    def forward(self, inputs, shortlist=None):
+
+        if shortlist is not None:
+            return self._shortlist_forward(inputs, shortlist)
 
         logits = linear(inputs, self.weight, self.bias)
         result = LazyDict()
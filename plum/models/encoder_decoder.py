@@ -1,4 +1,5 @@
-from ..types import register, PlumModule, HP, SM, LazyDict, Variable
+from ..types import register, PlumModule, HP, SM, LazyDict, Variable, props
+from ..seq2seq.search.multi import multi_search
 from .plum_model import PlumModel
 
 
@@ -15,6 +16,12 @@ class EncoderDecoder(PlumModel):
     controls = SM(required=False)
 
     search_algos = HP(required=False, default={})
+    # Optional callable (e.g. seq2seq.search.vocab_shortlist) mapping a batch
+    # to the target indices searches should score, or None for all.
+    search_shortlist = HP(required=False)
+    # Run all search_algos together in one decoding loop (see 
+    # seq2seq.search.multi_search) the first time any of them is looked up.
+    fuse_searches = HP(default=False, type=props.BOOLEAN)
 
     def forward(self, batch):
         # TODO make everything lazy.
@@ -43,16 +50,41 @@ class EncoderDecoder(PlumModel):
         # on gold data so we set up the searches here, to only be evaluated
         # if they are needed later by looking them up in decoder_state.
         decoder_state["search"] = LazyDict()
+        if self.fuse_searches:
+            self._set_fused_searches(decoder_state["search"], encoder_state,
+                                     ctrls, batch)
+            return decoder_state
+
         for name, algo in self.search_algos.items():
-            def make_search(algo, decoder, encoder_state, ctrls):
+            def make_search(algo, decoder, encoder_state, ctrls, batch):
                 def search_func():
-                    return algo(decoder, encoder_state, controls=ctrls)
+                    if self.search_shortlist is None:
+                        return algo(decoder, encoder_state, controls=ctrls)
+                    return algo(decoder, encoder_state, controls=ctrls,
+                                shortlist=self.search_shortlist(batch))
                 return search_func
             decoder_state["search"].lazy_set(
-                name, make_search(algo, self.decoder, encoder_state, ctrls))
+                name, make_search(algo, self.decoder, encoder_state, ctrls,
+                                  batch))
 
         return decoder_state
 
+    def _set_fused_searches(self, searches, encoder_state, ctrls, batch):
+        results = {}
+        def make_search(name):
+            def search_func():
+                if len(results) == 0:
+                    shortlist = None
+                    if self.search_shortlist is not None:
+                        shortlist = self.search_shortlist(batch)
+                    results.update(multi_search(
+                        self.search_algos, self.decoder, encoder_state, 
+                        controls=ctrls, shortlist=shortlist))
+                return results[name]
+            return search_func
+        for name in self.search_algos:
+            searches.lazy_set(name, make_search(name))
+
     def _multiref_state(self, encoder_state, num_refs):
         new_state = {}
 
@@ -5,6 +5,7 @@ except ModuleNotFoundError:
     import json
 from pathlib import Path
 import hashlib
+import copy
 
 try: 
     from importlib.resources import read_text
@@ -14,18 +15,25 @@ except ModuleNotFoundError:
 from pprint import pprint
 
 from .types import PLUM_OBJECT_REGISTRY
+from .dataio.vocab_reader import VocabReader, count_tokens
+from .vocab_file import VOCAB_SUFFIX, write_vocab_file
+from .dataio.fingerprint import dataset_fingerprint
 import plum
 
 
 class PlumParser:
     def __init__(self, registry=None, pprint_parse=False,
-                 vocab_cache=None, verbose=False):
+                 vocab_cache=None, verbose=False, vocab_workers=1):
         if registry is None:
             registry = PLUM_OBJECT_REGISTRY
         self._registry = registry
         self._pprint_parse = pprint_parse
         self._verbose = verbose
         self.vocab_cache = vocab_cache
+        # Vocab tokens are counted serially unless more workers are asked
+        # for, e.g. with plumr --vocab-workers.
+        self.vocab_workers = vocab_workers
+        self._vocab_counts = {}
 
     @property
     def pprint_parse(self):
@@ -90,6 +98,7 @@ class PlumParser:
 
         pointers = {"datasources": dict(), "vocabs": dict(), "models": dict(),
                 "programs": dict(), "pipelines": dict()}
+        self._count_vocab_tokens(config, pointers)
         plum_obj = self._recurse_and_parse(config, pointers)
 
         if self.verbose:
@@ -234,6 +243,77 @@ class PlumParser:
                 return {key: self._recurse_and_parse(value, pointers)
                         for key, value in config_item.items()} 
 
+    def _find_vocab_readers(self, config_item, readers):
+        if isinstance(config_item, (list, tuple)):
+            for x in config_item:
+                self._find_vocab_readers(x, readers)
+        elif isinstance(config_item, dict):
+            if "__plum_vocab__" in config_item and \
+                    config_item.get("__plum_type__") == "dataio.vocab_reader":
+                readers.setdefault(config_item["__plum_vocab__"], config_item)
+            else:
+                for x in config_item.values():
+                    self._find_vocab_readers(x, readers)
+
+    def _count_vocab_tokens(self, config, pointers):
+        # Vocab readers over the same datasource are counted together in
+        # one (parallel) pass over the data, instead of one pass per vocab.
+        # The counts are picked up by construct_vocab. Vocabs that will be
+        # read from the vocab cache are skipped.
+        readers = {}
+        self._find_vocab_readers(config, readers)
+
+        groups = {}
+        for name, reader in readers.items():
+            if name in pointers["vocabs"]:
+                continue
+            # Parse copies, since parsing consumes the __plum_ keys. Named
+            # datasources and pipelines built here are reused by the main
+            # parse through pointers.
+            dataset = self._recurse_and_parse(
+                copy.deepcopy(reader["dataset"]), pointers)
+            if self.vocab_cache is not None \
+                    and not reader.get("__plum_vocab_no_cache__", False):
+                canonical_json = json.dumps(
+                    {k: v for k, v in reader.items()
+                     if not k.startswith("__plum_")},
+                    sort_keys=True)
+                md5 = self._vocab_signature(canonical_json, dataset)
+                if self._vocab_cache_is_fresh(name, md5):
+                    continue
+            pipeline = self._recurse_and_parse(
+                copy.deepcopy(reader["pipeline"]), pointers)
+            group = groups.setdefault(id(dataset), (dataset, {}))
+            group[1][name] = pipeline
+
+        for dataset, pipelines in groups.values():
+            if self.verbose:
+                print("counting tokens for vocabs: {}".format(
+                    ", ".join(pipelines)))
+            self._vocab_counts.update(count_tokens(
+                dataset, pipelines, num_workers=self.vocab_workers,
+                verbose=self.verbose))
+
+    def _build_vocab(self, name, obj_type, vocab_args):
+        counts = self._vocab_counts.pop(name, None)
+        if counts is not None:
+            return VocabReader.from_counts(counts, **vocab_args)
+        return self._construct_plum_type(obj_type, vocab_args)
+
+    def _vocab_signature(self, canonical_json, dataset):
+        # md5 hash for vocab args and the contents of the underlying data
+        # source, so the cache survives touching or moving the data files.
+        string_repr = canonical_json + "\n" + dataset_fingerprint(dataset)
+        m = hashlib.md5()
+        m.update(string_repr.encode("utf8"))
+        return m.hexdigest()
+
+    def _vocab_cache_is_fresh(self, name, md5):
+        vocab_meta = self.vocab_cache / "{}.meta".format(name)
+        cache_path = self.vocab_cache / "{}{}".format(name, VOCAB_SUFFIX)
+        return vocab_meta.exists() and vocab_meta.read_text() == md5 \
+            and cache_path.exists()
+
     def construct_vocab(self, plum_keys, vocab_args, canonical_json, pointers):
 
         name = plum_keys["__plum_vocab__"]
@@ -252,38 +332,25 @@ class PlumParser:
         # supplied args and return it. 
         if self.vocab_cache is None \
                 or plum_keys.get("__plum_vocab_no_cache__", False):
-            vocab = self._construct_plum_type(obj_type, vocab_args)
+            vocab = self._build_vocab(name, obj_type, vocab_args)
             pointers[name] = vocab
             return vocab
 
         # Caching is enabled so generate md5 hash for vocab args and underlying
-        # data source paths/last modified times. 
-        string_buffers = []
-        if hasattr(vocab_args["dataset"], "paths"):
-            for path in vocab_args["dataset"].paths:
-                string_buffers.append(str(Path(path).resolve()))
-                string_buffers.append(str(Path(path).stat().st_mtime))
-        else:
-            for obj in vocab_args["dataset"]:
-                string_buffers.append(str(obj))
-
-        string_repr = canonical_json + "\n" + "  ".join(string_buffers)
-        m = hashlib.md5()
-        m.update(string_repr.encode("utf8"))
-        md5 = m.hexdigest()
+        # data source contents.
+        md5 = self._vocab_signature(canonical_json, vocab_args["dataset"])
 
         self.vocab_cache.mkdir(exist_ok=True, parents=True)
         vocab_meta = self.vocab_cache / "{}.meta".format(name)
-        cache_path = self.vocab_cache / "{}.pth".format(name)
+        cache_path = self.vocab_cache / "{}{}".format(name, VOCAB_SUFFIX)
 
-        if not vocab_meta.exists() or vocab_meta.read_text() != md5 or \
-                not cache_path.exists():
+        if not self._vocab_cache_is_fresh(name, md5):
 
             if self.verbose:
                 print("building vocab: {}".format(name))
 
-            vocab = self._construct_plum_type(obj_type, vocab_args)
-            vocab.save(cache_path)
+            vocab = self._build_vocab(name, obj_type, vocab_args)
+            write_vocab_file(vocab, cache_path)
             pointers[name] = vocab
             vocab_meta.write_text(md5)
             return vocab
@@ -188,6 +188,7 @@ def main():
     parser.add_argument("--run", type=str, nargs="+", default=None)
     parser.add_argument("--proj", type=Path, required=False, default=None)
     parser.add_argument("--gpu", type=int, default=-1)
+    parser.add_argument("--vocab-workers", type=int, default=1)
     parser.add_argument("--add-libs", nargs="+", default=None)
     parser.add_argument("--del-libs", nargs="+", default=None)
     args = parser.parse_args()
@@ -223,6 +224,7 @@ def main():
 
     plum_parser = plum.PlumParser(pprint_parse=args.pprint, 
                                   vocab_cache=vocab_cache,
+                                  vocab_workers=args.vocab_workers,
                                   verbose=pedantic)
     plum_object, plum_pointers, config_json = plum_parser.parse_file(
         args.config, return_json=True)
@@ -50,7 +50,7 @@ class RNNDecoder(PlumModule):
         return rnn_input.new_with_meta(new_data)
 
     def forward(self, inputs, encoder_state, prev_decoder_state=None,
-                controls=None):
+                controls=None, attention_cache=None, shortlist=None):
 
         rnn_input = self.input_net(inputs)
         if prev_decoder_state is None:
@@ -69,22 +69,39 @@ class RNNDecoder(PlumModule):
             rnn_output, rnn_state = self.rnn(rnn_input.data, 
                                              prev_decoder_state)
         
-        attention = self.attention_net(rnn_output, encoder_state["output"])
+        attention = self.attention_net(rnn_output, encoder_state["output"],
+                                       cache=attention_cache)
         if attention["output"] is not None:
             hidden_state = plum.cat([rnn_output, attention["output"]], dim=2)
         else:
             hidden_state = rnn_output
 
         pre_output = self.pre_output_net(hidden_state)
-        output = self.predictor_net(pre_output)
+        if shortlist is None:
+            output = self.predictor_net(pre_output)
+        else:
+            output = self.predictor_net(pre_output, shortlist=shortlist)
 
         output["decoder_state"] = rnn_state
         return output
 
+    def init_search_context(self, encoder_output, shortlist=None):
+        # Context passed to next_state at every search step. The attention
+        # over the encoder output is precomputed here, once per search, as 
+        # is the predictor for an optional shortlist of output indices.
+        return {
+            "encoder_output": encoder_output,
+            "attention_cache": self.attention_net.precompute(encoder_output),
+            "shortlist": self.predictor_net.shortlist(shortlist) 
+                if shortlist is not None else None,
+        }
+
     def next_state(self, prev_state, search_context, controls=None):
         decoder_state = prev_state["decoder_state"]
         return self.forward(
             prev_state["output"], 
             {"output": search_context["encoder_output"]},
             prev_decoder_state=decoder_state,
-            controls=controls)
+            controls=controls,
+            attention_cache=search_context.get("attention_cache", None),
+            shortlist=search_context.get("shortlist", None))
@@ -2,3 +2,5 @@ from .greedy import GreedySearch
 from .beam import BeamSearch
 from .greedy_npad import GreedyNPAD
 from .ancestral_sampler import AncestralSampler
+from .shortlist import VocabShortlist
+from .multi import multi_search
@@ -1,6 +1,8 @@
 from plum.types import register, PlumObject, HP, props, Variable
 import torch
 
+from .compact import select_rows, repeated_rows
+
 
 @register("seq2seq.search.ancestral_sampler")
 class AncestralSampler(PlumObject):
@@ -19,7 +21,7 @@ class AncestralSampler(PlumObject):
         self._states = []
         self._outputs = []
 
-    def init_state_context(self, encoder_state):
+    def init_state_context(self, decoder, encoder_state, shortlist=None):
         batch_size = encoder_state["state"].size(1) * self.samples
         
 
@@ -38,10 +40,13 @@ class AncestralSampler(PlumObject):
             .repeat(1, 1, self.samples, 1).view(layers, batch_size, -1)
         search_state = {"output": output, "decoder_state": decoder_state}
 
-        encoder_output = encoder_state["output"].repeat_batch_dim(self.samples)
-        context = {
-            "encoder_output": encoder_output
-        }
+        # Attention keys are precomputed once per batch item and then 
+        # repeated for each sample.
+        encoder_output = encoder_state["output"]
+        context = select_rows(
+            decoder.init_search_context(encoder_output, shortlist=shortlist),
+            repeated_rows(encoder_output.batch_size, self.samples,
+                          device=encoder_output.data.device))
 
         return search_state, context
 
@@ -113,13 +118,15 @@ class AncestralSampler(PlumObject):
         self._mask = None
         self._avg_log_probs = avg_log_probs
  
-    def __call__(self, decoder, encoder_state, controls=None):
+    def __call__(self, decoder, encoder_state, controls=None, 
+                 shortlist=None):
 
         self.reset()
         # TODO get batch size in a more reliable way. This will probably break
         # for cnn or transformer based models.
         batch_size = encoder_state["state"].size(1)
-        search_state, context = self.init_state_context(encoder_state)
+        search_state, context = self.init_state_context(
+            decoder, encoder_state, shortlist=shortlist)
 
         active_items = search_state["decoder_state"]\
             .new(batch_size * self.samples).byte().fill_(1)
@@ -169,8 +176,8 @@ class AncestralSampler(PlumObject):
                 return o
             tokens = []
             for row in o:
-                tokens.append([self.vocab[t] for t in row
-                               if t != self.vocab.pad_index])
+                tokens.append(self.vocab.tokens_many(
+                    [t for t in row.tolist() if t != self.vocab.pad_index]))
             return tokens
 
         elif n_best < self.samples:
@@ -185,7 +192,7 @@ class AncestralSampler(PlumObject):
         for beam in o:
             tokens = []
             for row in beam:
-                tokens.append([self.vocab[t] for t in row
-                               if t != self.vocab.pad_index])
+                tokens.append(self.vocab.tokens_many(
+                    [t for t in row.tolist() if t != self.vocab.pad_index]))
             beams.append(tokens)
         return beams
@@ -1,8 +1,9 @@
-import plum
 from plum.types import register, PlumObject, HP, props, Variable
 import torch
 import numpy as np
 
+from .compact import select_rows, repeated_rows
+
 
 @register("seq2seq.search.beam")
 class BeamSearch(PlumObject):
@@ -10,6 +11,9 @@ class BeamSearch(PlumObject):
     max_steps = HP(default=999999, type=props.INTEGER)
     beam_size = HP(default=4, type=props.INTEGER)
     vocab = HP()
+    # Drop the rows of batch items that completed all their beams from the
+    # search. Search results are the same either way, up to float rounding.
+    compact = HP(default=True, type=props.BOOLEAN)
     
     def __pluminit__(self):
         self.reset()
@@ -17,8 +21,8 @@ class BeamSearch(PlumObject):
     def reset(self):
         self.is_finished = False
         self.steps = 0
-        self._states = []
         self._outputs = []
+        self._backpointers = []
 
     def init_state(self, batch_size, encoder_state):
 
@@ -49,10 +53,10 @@ class BeamSearch(PlumObject):
         )
 
         # At the first time step no sequences have been terminated so this mask
-        # is all 0s. 
+        # is all 0s. It is built with a comparison, like the masks of later
+        # steps, so it has the mask dtype of the installed torch.
         beam_state["terminal_mask"] = (
-            encoder_state.new().byte().new(
-                1, batch_size * self.beam_size, 1).fill_(0)
+            encoder_state.new_zeros(1, batch_size * self.beam_size, 1).ne(0)
         )   
 
         return beam_state
@@ -66,67 +70,140 @@ class BeamSearch(PlumObject):
         return lp.view(1, batch_size * self.beam_size, 1)
 
 
-    def init_context(self, encoder_state):
-        n, bs, ds = encoder_state["output"].size()
-        beam_encoder_output = encoder_state["output"].repeat_batch_dim(
-            self.beam_size)
-            #.repeat(1, 1, self.beam_size, 1)\
-            #.view(n, bs * self.beam_size, ds)
-        return {"encoder_output": beam_encoder_output}
-
-    def __call__(self, decoder, encoder_state, controls=None):
+    def start(self, decoder, encoder_state, controls=None, shortlist=None,
+              context=None):
+        # Set up a search over encoder_state that is then run one decoder 
+        # step at a time with advance() until finished, and completed with
+        # finish(). context is the decoder search context of encoder_state,
+        # if it was already built (e.g. to share it with other searches).
         self.reset()
 
         # TODO get batch size in a more reliable way. This will probably break
         # for cnn or transformer based models.
         batch_size = encoder_state["state"].size(1)
-        search_state = self.init_state(batch_size, encoder_state["state"])
-        search_context = self.init_context(encoder_state)
-        active_items = search_state["decoder_state"].new(batch_size).byte() \
-            .fill_(1)
-
-        if controls is not None:
-            controls = controls.repeat_batch_dim(self.beam_size)
-
+        self._batch_size = batch_size
+        self._search_state = self.init_state(
+            batch_size, encoder_state["state"])
+
+        # The search context, including precomputed attention keys, and the
+        # controls are kept once per batch item. self.rows maps the rows of
+        # the search state to their batch items, and the context and 
+        # controls of the current rows are selected from these when needed.
+        if context is None:
+            context = decoder.init_search_context(
+                encoder_state["output"], shortlist=shortlist)
+        self._base_context = context
+        self._base_controls = controls
+
+        device = self._search_state["accum_log_prob"].device
         self._beam_scores = [list() for _ in range(batch_size)]
-        self._num_complete = search_state["decoder_state"].new()\
-            .long().new(batch_size).fill_(0)
+        self._num_complete = torch.zeros(
+            batch_size, dtype=torch.long, device=device)
         self._terminal_info = [list() for _ in range(batch_size)]
 
-        # Perform search until we either trigger a termination condition for
-        # each batch item or we reach the maximum number of search steps.
-        while self.steps < self.max_steps and not self.is_finished:
-            
-            search_state = self.next_state(
-                decoder, batch_size, search_state, search_context, 
-                active_items, controls)        
-            active_items = self.check_termination(search_state, active_items)
-            self._is_finished = torch.all(~active_items)
+        # Only the batch items in live_items are searched. When items
+        # complete all their beams (and compact is true), their rows are 
+        # dropped from the search state, context and controls, so the 
+        # decoder only runs over (number of live items * beam size) rows.
+        self._live_items = torch.arange(batch_size, device=device)
+        self.rows = repeated_rows(batch_size, self.beam_size, device=device)
+        self._context = None
+        self._controls = None
 
-            self._states.append(search_state)
-            self.steps += 1
+        return self
 
+    @property
+    def finished(self):
+        return self.steps >= self.max_steps \
+            or self._live_items.size(0) == 0
+
+    @property
+    def search_state(self):
+        return self._search_state
+
+    def step_context(self):
+        # Search context and controls of the current rows.
+        if self._context is None:
+            self._context = select_rows(self._base_context, self.rows)
+            self._controls = select_rows(self._base_controls, self.rows)
+        return self._context, self._controls
+
+    def advance(self, decoder_output):
+        # Take one search step given the decoder output for the current
+        # search state.
+        live_items = self._live_items
+        search_state = self.next_state(
+            decoder_output, live_items.size(0), self._search_state)
+        self._record_step(self._batch_size, search_state, live_items)
+        live_mask = self.check_termination(search_state, live_items)
+        self.steps += 1
+
+        if not live_mask.all():
+            keep = live_mask.nonzero().view(-1)
+            if keep.size(0) == 0 or self.compact:
+                self._live_items = live_items.index_select(0, keep)
+            if keep.size(0) > 0 and self.compact:
+                rows = self._beam_rows(keep)
+                search_state = select_rows(search_state, rows)
+                self.rows = self.rows.index_select(0, rows)
+                self._context = None
+                self._controls = None
+        self._search_state = search_state
+
+    def finish(self):
         # Finish the search by collecting final sequences, and other 
         # stats. 
-        self._collect_search_states(active_items)
-        self._incomplete_items = active_items
+        self._incomplete_items = self._num_complete < self.beam_size
+        self._collect_search_states(self._live_items, self._search_state)
         self._is_finished = True
 
+        self._search_state = None
+        self._base_context = self._base_controls = None
+        self._context = self._controls = None
         return self
 
-    def next_state(self, decoder, batch_size, prev_state, context, 
-                   active_items, controls):
+    def __call__(self, decoder, encoder_state, controls=None, 
+                 shortlist=None):
+        self.start(decoder, encoder_state, controls=controls, 
+                   shortlist=shortlist)
+
+        # Perform search until we either trigger a termination condition for
+        # each batch item or we reach the maximum number of search steps.
+        while not self.finished:
+            context, controls = self.step_context()
+            self.advance(decoder.next_state(
+                self.search_state, context, controls=controls))
+
+        return self.finish()
+
+    def _beam_rows(self, items):
+        # Rows of the batch * beam size layout holding the beams of items.
+        beams = torch.arange(self.beam_size, device=items.device)
+        return (items.view(-1, 1) * self.beam_size + beams.view(1, -1))\
+            .view(-1)
 
-        # Get next state from the decoder.
-        next_state = decoder.next_state(prev_state, context, controls=controls)
+    def next_state(self, next_state, batch_size, prev_state):
 
+        # next_state is the decoder output for prev_state.
         # Compute the top beam_size next outputs for each beam item.
         # topk_lps (1 x batch size x beam size x beam size)
         # candidate_outputs (1 x batch size x beam size x beam size)
-        topk_lps, candidate_outputs = torch.topk(
-            next_state["log_probs"].data \
-                .view(1, batch_size, self.beam_size, -1),
-            k=self.beam_size, dim=3)
+        # With an output shortlist, only the shortlisted log probs are 
+        # searched, and candidates are mapped back to vocab indices.
+        if "shortlist" in next_state \
+                and next_state["shortlist"].indices.size(0) \
+                    >= self.beam_size:
+            topk_lps, candidate_outputs = torch.topk(
+                next_state["shortlist_log_probs"].data \
+                    .view(1, batch_size, self.beam_size, -1),
+                k=self.beam_size, dim=3)
+            candidate_outputs = \
+                next_state["shortlist"].indices[candidate_outputs]
+        else:
+            topk_lps, candidate_outputs = torch.topk(
+                next_state["log_probs"].data \
+                    .view(1, batch_size, self.beam_size, -1),
+                k=self.beam_size, dim=3)
 
         # If any sequence was completed last step, we should mask it's log
         # prob so that we don't generate from the terminal token.
@@ -150,33 +227,20 @@ class BeamSearch(PlumObject):
         b_seq_lps, b_scores, b_output, b_indices = self._next_candidates(
             batch_size, candidate_log_probs, candidate_outputs)
 
-        # TODO re-implement this behavior
-        #next_state.stage_indexing("batch", b_indices)
+        # With a single beam every row keeps its own decoder state.
+        if self.beam_size == 1:
+            decoder_state = next_state["decoder_state"]
+        else:
+            decoder_state = next_state["decoder_state"]\
+                .index_select(1, b_indices)
 
-        next_state = {
-            "decoder_state": next_state["decoder_state"]\
-                .index_select(1, b_indices),
+        return {
+            "decoder_state": decoder_state,
             "output": b_output,
             "accum_log_prob": b_seq_lps,
             "beam_score": b_scores,
             "beam_indices": b_indices,
         }
-        return next_state
-        #exit()
-        #next_state = {"decoder_state": next_state["decoder_state"]
-        #print(next_state.keys())
-
-
-        next_state["output"] = (b_output, ("batch", "sequence"))
-        next_state["cumulative_log_probability"] = (
-            b_seq_lps, ("sequence", "batch", "placeholder")
-        )
-        next_state["beam_score"] = (
-            b_scores, ("sequence", "batch", "placeholder")
-        )
-        next_state["beam_indices"] = (b_indices, ("batch"))
-
-        return next_state
 
     def _next_candidates(self, batch_size, log_probs, candidates):
         # TODO seq_lps should really be called cumulative log probs.
@@ -224,17 +288,36 @@ class BeamSearch(PlumObject):
 
         return beam_seq_lps, beam_seq_scores, next_output, beam_indexing
 
-    def check_termination(self, next_state, active_items):
+    def _record_step(self, batch_size, next_state, live_items):
+        # Record this step's outputs and backpointers in the full 
+        # batch * beam size layout. Rows of finished items get pad outputs
+        # and point to themselves.
+        live_rows = self._beam_rows(live_items)
+        output = next_state["output"].data.view(-1)
+        outputs = output.new(batch_size * self.beam_size)\
+            .fill_(self.vocab.pad_index)\
+            .index_copy_(0, live_rows, output)
+        backpointers = torch.arange(
+            batch_size * self.beam_size, device=output.device)\
+            .index_copy_(0, live_rows, 
+                         live_rows.index_select(0, next_state["beam_indices"]))
+        self._outputs.append(outputs)
+        self._backpointers.append(backpointers)
+        del next_state["beam_indices"]
+
+    def check_termination(self, next_state, live_items):
         
-        # view as batch size x beam size 
+        # view as live items x beam size 
         next_output = next_state["output"].data \
             .view(-1, self.beam_size)
-        batch_size = next_output.size(0)
+        num_live = next_output.size(0)
 
         is_complete = next_output.eq(self.vocab.stop_index)
         complete_indices = np.where(is_complete.cpu().data.numpy())
+        live_batch = live_items.tolist()
 
-        for batch, beam in zip(*complete_indices):
+        for item, beam in zip(*complete_indices):
+            batch = live_batch[item]
             if self._num_complete[batch] == self.beam_size:
                 continue
             else:
@@ -245,84 +328,71 @@ class BeamSearch(PlumObject):
                 self._terminal_info[batch].append(
                     (self.steps, beam + batch * self.beam_size))
                 
-                IDX = batch * self.beam_size + beam
+                IDX = item * self.beam_size + beam
                 self._beam_scores[batch].append(
                     next_state["beam_score"][0, IDX, 0].view(1))
         
         next_state["terminal_mask"] = (
-            is_complete.view(1, batch_size * self.beam_size, 1)
+            is_complete.view(1, num_live * self.beam_size, 1)
         )   
-        active_items = self._num_complete < self.beam_size
 
-        return active_items
+        return self._num_complete.index_select(0, live_items) \
+            < self.beam_size
 
-    def _collect_search_states(self, active_items):
+    def _collect_search_states(self, live_items, last_state):
 
-        batch_size = active_items.size(0)
+        batch_size = self._num_complete.size(0)
 
-        last_state = self._states[-1]
+        # The rows of last_state hold the beams of live_items.
         last_step = self.steps - 1
-        for batch in range(batch_size):
+        for item, batch in enumerate(live_items.tolist()):
             beam = 0 
             while len(self._beam_scores[batch]) < self.beam_size:
-                IDX = batch * self.beam_size + beam
+                IDX = item * self.beam_size + beam
                 self._beam_scores[batch].append(
                     last_state["beam_score"][0, IDX, 0].view(1))
                 self._terminal_info[batch].append(
                     (last_step, beam + batch * self.beam_size))
                 beam += 1
 
-        # TODO consider removing beam indices from state
-        beam_indices = torch.stack([state["beam_indices"] 
-                                    for state in self._states])
+        backpointers = torch.stack(self._backpointers)
 
         self._beam_scores = torch.stack([torch.cat(bs)
                                          for bs in self._beam_scores])
         
-        lengths = self._states[0]["output"].new(
+        lengths = self._outputs[0].new(
             [[step + 1 for step, beam in self._terminal_info[batch]]
              for batch in range(batch_size)])
         
-        selector = self._states[0]["output"].new(
+        selector = self._outputs[0].new(
             batch_size, self.beam_size, lengths.max())
-        mask = selector.new().byte().new(selector.size()).fill_(1)
 
         for batch in range(batch_size):
             for beam in range(self.beam_size):
                 step, real_beam = self._terminal_info[batch][beam]
-                mask[batch, beam,:step + 1].fill_(0)
                 self._collect_beam(batch, real_beam, step, 
-                                   beam_indices,
+                                   backpointers,
                                    selector[batch, beam])
         selector = selector.view(batch_size * self.beam_size, -1)
 
         ## RESORTING HERE ##
         #if self.sort_by_score:
         # TODO make this an option again
-        if True:
-            self._beam_scores, I = torch.sort(self._beam_scores, dim=1,
-                                              descending=True)
-            offset1 = (
-                torch.arange(batch_size, device=I.device) * self.beam_size
-            ).view(batch_size, 1)
-            II = I + offset1
-            selector = selector[II.view(-1)]
-            mask = mask.view(batch_size * self.beam_size,-1)[II]\
-                .view(batch_size, self.beam_size, -1)
-            lengths = lengths.gather(1, I)
+        self._beam_scores, I = torch.sort(self._beam_scores, dim=1,
+                                          descending=True)
+        offset1 = (
+            torch.arange(batch_size, device=I.device) * self.beam_size
+        ).view(batch_size, 1)
+        II = I + offset1
+        selector = selector[II.view(-1)]
+        lengths = lengths.gather(1, I)
         ## 
 
-        # TODO reimplement staged indexing         
-#        for step, sel_step in enumerate(selector.split(1, dim=1)):
-#            self._states[step].stage_indexing("batch", sel_step.view(-1))
-
         self._output = []
         for step, sel_step in enumerate(selector.split(1, dim=1)):
             self._output.append(
-                self._states[step]["output"].index_select(1, sel_step.view(-1))
-            )
-        #print(self._states[0]["output"].size())
-        self._output = plum.cat([o.data for o in self._output], 0).t()\
+                self._outputs[step].index_select(0, sel_step.view(-1)))
+        self._output = torch.stack(self._output).t()\
             .view(batch_size, self.beam_size, -1)
         
         for i in range(batch_size):
@@ -333,37 +403,12 @@ class BeamSearch(PlumObject):
 
         return self        
 
-
-#        for batch_out in self._output:
-#        #print(self._output.t().view(batch_size)
-#        #for batch_out in self._output.t().view(batch_size, self.beam_size, -1):
-#            for row in batch_out:
-#                print(" ".join([self.vocab[t] for t in row if t != self.vocab.pad_index]))
-#            print()
-#        print(lengths)
-#        print(lengths.size())
-#        print(batch_size)
-#        exit()
-#
-#        states = self._states[0]
-#        for state in self._states[1:]:
-#            states.append(state)
-#
-#        self._states = states
-#        self._selector = selector
-#        self._lengths = lengths
-#        self._selector_mask = mask.view(self.batch_size * self.beam_size, -1)
-#        self._selector_mask_T = self._selector_mask.t().contiguous()
-
-    def _collect_beam(self, batch, beam, step, beam_indices,
+    def _collect_beam(self, batch, beam, step, backpointers,
                       selector_out):        
-        selection = [0] * beam_indices.size(0)
         selector_out[step + 1:].fill_(0) 
         while step >= 0:
-            selection[step] = beam
             selector_out[step].fill_(beam)
-            next_beam = beam_indices[step, beam].item()
-            beam = next_beam
+            beam = backpointers[step, beam].item()
             step -= 1
 
     def output(self, as_indices=False, n_best=-1):
@@ -373,8 +418,8 @@ class BeamSearch(PlumObject):
                 return o
             tokens = []
             for row in o:
-                tokens.append([self.vocab[t] for t in row
-                               if t != self.vocab.pad_index])
+                tokens.append(self.vocab.tokens_many(
+                    [t for t in row.tolist() if t != self.vocab.pad_index]))
             return tokens
 
         elif n_best < self.beam_size:
@@ -389,7 +434,7 @@ class BeamSearch(PlumObject):
         for beam in o:
             tokens = []
             for row in beam:
-                tokens.append([self.vocab[t] for t in row
-                               if t != self.vocab.pad_index])
+                tokens.append(self.vocab.tokens_many(
+                    [t for t in row.tolist() if t != self.vocab.pad_index]))
             beams.append(tokens)
         return beams
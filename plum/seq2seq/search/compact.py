@@ -0,0 +1,92 @@
+from plum.types import Variable, LazyDict
+import torch
+
+
+def select_rows(value, rows):
+    # Select the batch rows (a LongTensor of indices) of a search state
+    # value, used to drop finished items from a search. Variables are
+    # indexed along their batch dim, dicts are selected value by value,
+    # 1-d tensors along dim 0 and other tensors along dim 1, the batch dim
+    # of the (sequence x batch x features) decoder tensors. Anything else
+    # (e.g. an output shortlist) is shared by all rows and kept as is.
+    if value is None:
+        return None
+    elif isinstance(value, dict):
+        return {name: select_rows(item, rows) for name, item in value.items()}
+    elif isinstance(value, Variable):
+        return value.index_select(value.batch_dim, rows)
+    elif not torch.is_tensor(value):
+        return value
+    elif value.dim() == 1:
+        return value.index_select(0, rows)
+    else:
+        return value.index_select(1, rows)
+
+def repeated_rows(batch_size, repeats, device=None):
+    # Row indices that repeat each of batch_size rows repeats times in
+    # place, i.e. select_rows(value, repeated_rows(...)) is the same as
+    # Variable.repeat_batch_dim(repeats).
+    return torch.arange(batch_size, device=device).view(-1, 1)\
+        .repeat(1, repeats).view(-1)
+
+def cat_rows(values):
+    # Concatenate the batch rows of a list of search state values of the
+    # same structure, with the same conventions as select_rows.
+    first = values[0]
+    if first is None:
+        return None
+    elif isinstance(first, dict):
+        return {name: cat_rows([value[name] for value in values])
+                for name in first}
+    elif isinstance(first, Variable):
+        return Variable(
+            torch.cat([value.data for value in values], first.batch_dim),
+            lengths=torch.cat([value.lengths for value in values]),
+            length_dim=first.length_dim, batch_dim=first.batch_dim,
+            pad_value=first.pad_value)
+    elif not torch.is_tensor(first):
+        return first
+    elif first.dim() == 1:
+        return torch.cat(values, 0)
+    else:
+        return torch.cat(values, 1)
+
+def narrow_rows(value, start, length):
+    # The batch rows start to start + length of a search state value, with
+    # the same conventions as select_rows.
+    if value is None:
+        return None
+    elif isinstance(value, dict):
+        return {name: narrow_rows(item, start, length) 
+                for name, item in value.items()}
+    elif isinstance(value, Variable):
+        return Variable(
+            value.data.narrow(value.batch_dim, start, length),
+            lengths=value.lengths.narrow(0, start, length),
+            length_dim=value.length_dim, batch_dim=value.batch_dim,
+            pad_value=value.pad_value)
+    elif not torch.is_tensor(value):
+        return value
+    elif value.dim() == 1:
+        return value.narrow(0, start, length)
+    else:
+        return value.narrow(1, start, length)
+
+def _curry_narrow(output, key, start, length):
+    def narrow():
+        return narrow_rows(output[key], start, length)
+    return narrow
+
+def split_rows(output, sizes):
+    # Split a decoder output (a LazyDict) over consecutive blocks of rows of
+    # the given sizes into one LazyDict per block. Values are only computed
+    # and split when a block looks them up.
+    splits = []
+    start = 0
+    for size in sizes:
+        split = LazyDict()
+        for key in output:
+            split.lazy_set(key, _curry_narrow(output, key, start, size))
+        splits.append(split)
+        start += size
+    return splits
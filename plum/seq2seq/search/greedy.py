@@ -1,6 +1,8 @@
 from plum.types import register, PlumObject, HP, props, Variable
 import torch
 
+from .compact import select_rows
+
 
 @register("seq2seq.search.greedy")
 class GreedySearch(PlumObject):
@@ -14,7 +16,6 @@ class GreedySearch(PlumObject):
     def reset(self):
         self.is_finished = False
         self.steps = 0
-        self._states = []
         self._outputs = []
 
     def init_state(self, batch_size, encoder_state):
@@ -29,80 +30,123 @@ class GreedySearch(PlumObject):
 
         return {"output": output, "decoder_state": encoder_state}
 
-    def next_state(self, decoder, prev_state, context, active_items,
-                   controls):
-
-        # Get next state from the decoder.
-        next_state = decoder.next_state(prev_state, context, controls=controls)
-
-        # Mask outputs if we have already completed that batch item. 
-        next_state["output"].data.view(-1).masked_fill_(
-            ~active_items, self.vocab.pad_index)
-
-        return next_state
-
-    def check_termination(self, next_state, active_items):
+    def check_termination(self, next_state):
 
-        # Check for stop tokens and batch item inactive if so.
-        nonstop_tokens = next_state["output"].data.view(-1).ne(
-            self.vocab.stop_index)
-        active_items = active_items.data.mul_(nonstop_tokens)
-
-        return active_items
+        # Check for stop tokens, returning which rows are still active.
+        return next_state["output"].data.view(-1).ne(self.vocab.stop_index)
 
     def _collect_search_states(self, active_items):
         # TODO implement search states api.
-        #search_state = self._states[0]
-        #for next_state in self._states[1:]:
-        #    search_state.append(next_state)
-        #self._states = search_state
-        self._outputs = torch.cat([o.data for o in self._outputs], dim=0)
- 
-    def __call__(self, decoder, encoder_state, controls=None):
-
+        self._outputs = torch.cat(self._outputs, dim=0)
+
+    def start(self, decoder, encoder_state, controls=None, shortlist=None,
+              context=None):
+        # Set up a search over encoder_state that is then run one decoder 
+        # step at a time with advance() until finished, and completed with
+        # finish(). context is the decoder search context of encoder_state,
+        # if it was already built (e.g. to share it with other searches).
         self.reset()
         # TODO get batch size in a more reliable way. This will probably break
         # for cnn or transformer based models.
         batch_size = encoder_state["state"].size(1)
-        search_state = self.init_state(batch_size, encoder_state["state"])
-        context = {
-            "encoder_output": encoder_state["output"],
-        }
-        active_items = search_state["decoder_state"].new(batch_size).byte() \
-            .fill_(1)
-
-        step_masks = []
-        # Perform search until we either trigger a termination condition for
-        # each batch item or we reach the maximum number of search steps.
-        while self.steps < self.max_steps and not self.is_finished:
-            
-            inactive_items = ~active_items
+        self._batch_size = batch_size
+        self._search_state = self.init_state(
+            batch_size, encoder_state["state"])
+        if context is None:
+            context = decoder.init_search_context(
+                encoder_state["output"], shortlist=shortlist)
+        self._base_context = context
+        self._base_controls = controls
+        # Built with a comparison so ~ is a logical not on any torch.
+        self._active_items = self._search_state["decoder_state"]\
+            .new_ones(batch_size).ne(0)
+
+        # Only the batch items in self.rows are decoded. Items are dropped
+        # from the search state, context and controls as soon as they 
+        # produce a stop token, and their outputs are pad afterwards, the
+        # same as without dropping them (up to float rounding).
+        self.rows = torch.arange(
+            batch_size, device=self._search_state["output"].data.device)
+        self._context = None
+        self._controls = None
+        self._step_masks = []
 
-            # Mask any inputs that are finished, so that greedy would 
-            # be identitcal to forward passes. 
-            search_state["output"].data.view(-1).masked_fill_(
-                inactive_items, self.vocab.pad_index)
-
-            step_masks.append(inactive_items)
-            self.steps += 1
-            search_state = self.next_state(
-                decoder, search_state, context, active_items, controls)        
-            
-            self._states.append(search_state)
-            self._outputs.append(search_state["output"].clone())
-
-            active_items = self.check_termination(search_state, active_items)
-            self.is_finished = torch.all(~active_items)
+        return self
 
+    @property
+    def finished(self):
+        return self.is_finished or self.steps >= self.max_steps
+
+    @property
+    def search_state(self):
+        return self._search_state
+
+    def step_context(self):
+        # Search context and controls of the current rows.
+        if self._context is None:
+            self._context = select_rows(self._base_context, self.rows)
+            self._controls = select_rows(self._base_controls, self.rows)
+        return self._context, self._controls
+
+    def advance(self, decoder_output):
+        # Take one search step given the decoder output for the current
+        # search state. Finished batch items have been dropped from the 
+        # search, so every row is still active.
+        self._step_masks.append(~self._active_items)
+        self.steps += 1
+        live_items = self.rows
+
+        output = decoder_output["output"].data.view(-1)
+        self._outputs.append(
+            output.new(1, self._batch_size).fill_(self.vocab.pad_index)\
+                .index_copy_(1, live_items, output.view(1, -1)))
+
+        live_mask = self.check_termination(decoder_output)
+        self._active_items.index_copy_(
+            0, live_items, live_mask.type_as(self._active_items))
+
+        search_state = decoder_output
+        if not live_mask.all():
+            keep = live_mask.nonzero().view(-1)
+            self.rows = live_items.index_select(0, keep)
+            self.is_finished = self.rows.size(0) == 0
+            if not self.is_finished:
+                search_state = select_rows(
+                    {"output": decoder_output["output"],
+                     "decoder_state": decoder_output["decoder_state"]},
+                    keep)
+                self._context = None
+                self._controls = None
+        self._search_state = search_state
+
+    def finish(self):
         # Finish the search by collecting final sequences, and other 
         # stats. 
-        self._collect_search_states(active_items)
-        self._incomplete_items = active_items
+        self._collect_search_states(self._active_items)
+        self._incomplete_items = self._active_items
         self._is_finished = True
 
-        self._mask_T = torch.stack(step_masks)
+        self._mask_T = torch.stack(self._step_masks)
         self._mask = self._mask_T.t().contiguous()
+
+        self._search_state = None
+        self._base_context = self._base_controls = None
+        self._context = self._controls = None
         return self
+
+    def __call__(self, decoder, encoder_state, controls=None, 
+                 shortlist=None):
+        self.start(decoder, encoder_state, controls=controls, 
+                   shortlist=shortlist)
+
+        # Perform search until we either trigger a termination condition for
+        # each batch item or we reach the maximum number of search steps.
+        while not self.finished:
+            context, controls = self.step_context()
+            self.advance(decoder.next_state(
+                self.search_state, context, controls=controls))
+
+        return self.finish()
         
     def __getitem__(self, key):
         if key == "output":
@@ -115,9 +159,8 @@ class GreedySearch(PlumObject):
 
         tokens = []
         for output in self._outputs.t():
-            tokens.append(
-                [self.vocab[index] for index in output 
-                 if index != self.vocab.pad_index]
-            )
+            tokens.append(self.vocab.tokens_many(
+                [index for index in output.tolist()
+                 if index != self.vocab.pad_index]))
 
         return tokens
@@ -0,0 +1,116 @@
+import torch
+
+from .beam import BeamSearch
+from .greedy import GreedySearch
+from .compact import select_rows, cat_rows, split_rows
+
+
+def _greedy_key(search):
+    # Greedy searches and beam searches with a single beam find the same
+    # outputs when they share a vocab and max_steps.
+    if isinstance(search, GreedySearch) or (
+            isinstance(search, BeamSearch) and search.beam_size == 1):
+        return (id(search.vocab), search.max_steps)
+    return None
+
+def _copy_result(search, source):
+    # Fill the finished search with the results of the equivalent finished
+    # search source, which is a single beam search unless both are greedy.
+    search.reset()
+    search.steps = source.steps
+    search._incomplete_items = source._incomplete_items
+    search._is_finished = True
+    if isinstance(search, BeamSearch):
+        search._output = source._output
+        search._lengths = source._lengths
+        search._beam_scores = source._beam_scores
+    elif isinstance(source, GreedySearch):
+        search._outputs = source._outputs
+        search._mask_T = source._mask_T
+        search._mask = source._mask
+    else:
+        # The single beam outputs are padded after the stop token, so the
+        # greedy outputs are their transpose, and greedy steps are masked
+        # from the step after each item stopped.
+        search._outputs = source._output[:, 0].t().contiguous()
+        positions = torch.arange(
+            search._outputs.size(0), device=search._outputs.device)
+        search._mask_T = positions.view(-1, 1) \
+            >= source._lengths[:, 0].view(1, -1)
+        search._mask = search._mask_T.t().contiguous()
+
+def multi_search(searches, decoder, encoder_state, controls=None,
+                 shortlist=None):
+    # Run a dict of searches over the same encoder_state in a single
+    # decoding loop and return the dict of finished searches. The decoder
+    # search context (e.g. the attention key cache) is built once and shared
+    # by all searches, and at every step the rows of all unfinished
+    # searches are decoded together in one decoder call. Of several
+    # equivalent greedy and single beam searches only one is run, and the
+    # others are filled in with its results. Searches without a step-wise
+    # api (e.g. samplers) are run on their own.
+    stepwise = []
+    standalone = []
+    copies = []
+    greedy_like = {}
+    for name, search in searches.items():
+        key = _greedy_key(search)
+        if key is not None:
+            greedy_like.setdefault(key, []).append(name)
+        elif hasattr(search, "advance"):
+            stepwise.append(name)
+        else:
+            standalone.append(name)
+    for names in greedy_like.values():
+        # A single beam search can fill greedy searches, but not the other
+        # way around.
+        beams = [name for name in names
+                 if isinstance(searches[name], BeamSearch)]
+        source = beams[0] if beams else names[0]
+        stepwise.append(source)
+        copies.extend((name, source) for name in names if name != source)
+
+    context = decoder.init_search_context(
+        encoder_state["output"], shortlist=shortlist)
+    running = [searches[name] for name in stepwise]
+    for search in running:
+        search.start(decoder, encoder_state, controls=controls,
+                     shortlist=shortlist, context=context)
+
+    # The context and controls of the concatenated rows are only selected
+    # again when some search has dropped rows.
+    step_rows = None
+    while True:
+        running = [search for search in running if not search.finished]
+        if len(running) == 0:
+            break
+        rows = [search.rows for search in running]
+        if step_rows is None or len(rows) != len(step_rows) \
+                or any(a is not b for a, b in zip(rows, step_rows)):
+            step_rows = rows
+            all_rows = torch.cat(rows)
+            step_context = select_rows(context, all_rows)
+            step_controls = select_rows(controls, all_rows)
+
+        prev_state = cat_rows(
+            [{"output": search.search_state["output"],
+              "decoder_state": search.search_state["decoder_state"]}
+             for search in running])
+        decoder_output = decoder.next_state(
+            prev_state, step_context, controls=step_controls)
+        outputs = split_rows(decoder_output, [r.size(0) for r in rows])
+        for search, search_output in zip(running, outputs):
+            search.advance(search_output)
+
+    for name in stepwise:
+        searches[name].finish()
+    for name, source in copies:
+        _copy_result(searches[name], searches[source])
+    for name in standalone:
+        if shortlist is None:
+            searches[name](decoder, encoder_state, controls=controls)
+        else:
+            searches[name](decoder, encoder_state, controls=controls,
+                           shortlist=shortlist)
+
+    return {name: searches[name] for name in searches}
@@ -0,0 +1,62 @@
+from plum.types import register, PlumObject, HP, props, Variable
+import torch
+
+
+@register("seq2seq.search.vocab_shortlist")
+class VocabShortlist(PlumObject):
+
+    # Decode time output shortlist. For a batch, searches only score the
+    # target vocab entries of the batch's source tokens (matched by
+    # string), the top_n most frequent targets (by target_vocab.counts, or
+    # vocab order if there are no counts) and the special tokens. When the
+    # shortlist would cover more than max_fraction of the target vocab,
+    # None is returned and searches use the full softmax.
+
+    source_vocab = HP()
+    target_vocab = HP()
+    source_inputs = HP(default="source_inputs", type=props.STRING)
+    top_n = HP(default=2000, type=props.INTEGER)
+    max_fraction = HP(default=0.5, type=props.REAL)
+
+    def __pluminit__(self, source_vocab, target_vocab, top_n):
+        self._source2target = torch.LongTensor(
+            [target_vocab.tokens2index.get(token, -1)
+             for token in source_vocab.index2tokens])
+
+        frequent = list(range(len(target_vocab)))
+        counts = target_vocab.counts
+        if counts is not None:
+            frequent.sort(
+                key=lambda index: counts.get(target_vocab.token(index), 0),
+                reverse=True)
+        specials = [target_vocab.pad_index, target_vocab.unknown_index,
+                    target_vocab.start_index, target_vocab.stop_index]
+
+        self._base_mask = torch.zeros(len(target_vocab), dtype=torch.uint8)
+        self._base_mask[frequent[:max(top_n, 0)]] = 1
+        self._base_mask[[index for index in specials 
+                         if index is not None]] = 1
+        self._device_tensors = {}
+
+    def _tensors(self, device):
+        key = str(device)
+        if key not in self._device_tensors:
+            self._device_tensors[key] = (self._source2target.to(device),
+                                         self._base_mask.to(device))
+        return self._device_tensors[key]
+
+    def __call__(self, batch):
+        # Sorted LongTensor of target vocab indices to score for batch, or
+        # None to use the full vocab.
+        source = batch[self.source_inputs]
+        if isinstance(source, Variable):
+            source = source.data
+        source2target, base_mask = self._tensors(source.device)
+
+        targets = source2target.index_select(0, source.contiguous().view(-1))
+        mask = base_mask.clone()
+        mask[targets[targets >= 0]] = 1
+
+        if mask.long().sum().item() > self.max_fraction * mask.size(0):
+            return None
+        return mask.nonzero().view(-1)
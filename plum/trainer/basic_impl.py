@@ -67,6 +67,8 @@ class BasicTrainer(PlumObject):
 
         self._tb_writer.close()
         self.close_loggers()
+        self.train_batches.close()
+        self.valid_batches.close()
 
     def preflight_checks(self, env, verbose=False):
 
@@ -52,11 +52,22 @@ class Variable:
     def batch_size(self):
         return self.data.size(self.batch_dim)
     
-    def cuda(self, device):
-        new = self.new_with_meta(self.data.cuda(device))
-        new._lengths = new.lengths.cuda(device)
+    def cuda(self, device, non_blocking=False):
+        new = self.new_with_meta(
+            self.data.cuda(device, non_blocking=non_blocking))
+        new._lengths = new.lengths.cuda(device, non_blocking=non_blocking)
         return new
 
+    def pin_memory(self):
+        # Called by DataLoader(pin_memory=True) on custom batch types.
+        new = self.new_with_meta(self.data.pin_memory())
+        new._lengths = new.lengths.pin_memory()
+        return new
+
+    def record_stream(self, stream):
+        self.data.record_stream(stream)
+        self.lengths.record_stream(stream)
+
     def size(self, *args, **kwargs):
         return self._data.size(*args, **kwargs)
 
@@ -166,7 +177,10 @@ class Variable:
 
     def index_select(self, dim, index):
         new_data = self.data.index_select(dim, index)
-        if dim != self.length_dim:
+        if dim == self.batch_dim and self.lengths is not None:
+            return self.new_with_meta(
+                new_data, lengths=self.lengths.index_select(0, index))
+        elif dim != self.length_dim:
             return self.new_with_meta(new_data)
         else:
             if (index.view(-1, 1) >= self.lengths.view(1, -1)).any():
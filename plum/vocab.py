@@ -1,5 +1,7 @@
 from .types import register, PlumObject, HP, props
 
+import numpy as np
+
 
 @register("plum.vocab")
 class Vocab(PlumObject):
@@ -69,6 +71,65 @@ class Vocab(PlumObject):
         else:
             return self.token(word_or_index)
 
+    def __getstate__(self):
+        # Pickle (e.g. when sending pipelines to spawned DataLoader workers)
+        # the tokens as one NUL separated string and their counts as an
+        # int64 array, rather than a list, a dict repeating every token,
+        # and a dict of counts. The dicts are rebuilt on unpickling.
+        state = {name: getattr(self, name)
+                 for name in ["pad", "unk", "start", "stop"]}
+        if any("\0" in token for token in self.index2tokens):
+            state["tokens"] = list(self.index2tokens)
+        else:
+            state["tokens"] = "\0".join(self.index2tokens)
+        if self.counts is None:
+            state["counts"] = None
+        else:
+            counts = self.counts
+            # Tokens without a count (e.g. special tokens) are stored as -1.
+            state["counts"] = np.array(
+                [counts.get(token, -1) for token in self.index2tokens],
+                dtype=np.int64)
+            state["other_counts"] = {token: count
+                                     for token, count in counts.items()
+                                     if token not in self.tokens2index}
+        return state
+
+    def __setstate__(self, state):
+        index2tokens = state.pop("tokens")
+        if isinstance(index2tokens, str):
+            index2tokens = index2tokens.split("\0") if index2tokens else []
+        tokens2index = {token: i for i, token in enumerate(index2tokens)}
+        counts = state.pop("counts")
+        if counts is not None:
+            counts = {token: count
+                      for token, count in zip(index2tokens, counts.tolist())
+                      if count != -1}
+            counts.update(state.pop("other_counts"))
+        self.__init__(index2tokens=index2tokens, tokens2index=tokens2index,
+                      counts=counts, **state)
+
+    def lookup_many(self, tokens):
+        # Indices of a sequence of tokens as an int64 array, with unknown
+        # tokens mapped to the unknown index. Python's dict is already a
+        # hash table over the token strings, so this avoids the per token
+        # __getitem__/index dispatch and the python list of ints instead.
+        get = self.tokens2index.get
+        unk_idx = -1 if self._unk_idx is None else self._unk_idx
+        indices = np.fromiter((get(token, unk_idx) for token in tokens),
+                              dtype=np.int64, count=len(tokens))
+        if unk_idx == -1 and len(indices) > 0 and indices.min() < 0:
+            # Raise the same error as index.
+            self.index(tokens[int(np.argmin(indices))])
+        return indices
+
+    def tokens_many(self, indices):
+        # Tokens for a sequence, numpy array or tensor of indices.
+        if hasattr(indices, "tolist"):
+            indices = indices.tolist()
+        index2tokens = self.index2tokens
+        return [index2tokens[index] for index in indices]
+
     def index(self, token):
         index = self.tokens2index.get(token, self._unk_idx)
         if index is None:
@@ -0,0 +1,131 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .vocab import Vocab
+
+
+# Binary vocab layout: an 8 byte magic string, a header of int64 fields
+# (see _HEADER), then int64 arrays and utf8 blobs:
+#
+#   offsets        [num_tokens + 1]  token i is blob[offsets[i]:offsets[i+1]]
+#   counts         [num_tokens]      only if has_counts, -1 for no count
+#   other_offsets  [num_other + 1]   counted tokens that are not in the vocab
+#   other_counts   [num_other]
+#   blob           [blob_size]
+#   other_blob     [other_blob_size]
+#
+# The special token fields hold vocab indices, or -1 if not set.
+VOCAB_MAGIC = b"PLUMVOC1"
+VOCAB_SUFFIX = ".vocab"
+_HEADER = ["num_tokens", "blob_size", "has_counts", "num_other",
+           "other_blob_size", "pad", "unk", "start", "stop"]
+_HEADER_SIZE = len(VOCAB_MAGIC) + 8 * len(_HEADER)
+
+
+def pack_tokens(tokens):
+    # Encode a list of strings as one utf8 blob plus an int64 array of
+    # num_tokens + 1 offsets.
+    encoded = [token.encode("utf8") for token in tokens]
+    offsets = np.zeros((len(encoded) + 1,), dtype=np.int64)
+    np.cumsum([len(x) for x in encoded], out=offsets[1:])
+    return b"".join(encoded), offsets
+
+def unpack_tokens(blob, offsets):
+    blob = bytes(blob)
+    offsets = offsets.tolist()
+    return [blob[start:stop].decode("utf8")
+            for start, stop in zip(offsets[:-1], offsets[1:])]
+
+def is_vocab_file(path):
+    try:
+        with open(str(path), "rb") as fp:
+            return fp.read(len(VOCAB_MAGIC)) == VOCAB_MAGIC
+    except (OSError, TypeError):
+        return False
+
+def write_vocab_file(vocab, path):
+    # Written to a temporary file and moved into place so concurrent readers
+    # never see a partial vocab.
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+
+    blob, offsets = pack_tokens(vocab.index2tokens)
+    counts = np.zeros((0,), dtype=np.int64)
+    other_tokens = []
+    other_counts = np.zeros((0,), dtype=np.int64)
+    if vocab.counts is not None:
+        counts = np.array(
+            [vocab.counts.get(token, -1) for token in vocab.index2tokens],
+            dtype=np.int64)
+        other_tokens = [token for token in vocab.counts
+                        if token not in vocab.tokens2index]
+        other_counts = np.array(
+            [vocab.counts[token] for token in other_tokens], dtype=np.int64)
+    other_blob, other_offsets = pack_tokens(other_tokens)
+
+    specials = [vocab.pad_index, vocab.unknown_index, vocab.start_index,
+                vocab.stop_index]
+    header = np.array(
+        [len(vocab.index2tokens), len(blob), int(vocab.counts is not None),
+         len(other_tokens), len(other_blob)] \
+        + [-1 if index is None else index for index in specials],
+        dtype=np.int64)
+
+    tmp_path = path.parent / "{}.{}.tmp".format(path.name, os.getpid())
+    try:
+        with open(str(tmp_path), "wb") as fp:
+            fp.write(VOCAB_MAGIC)
+            for array in [header, offsets, counts, other_offsets,
+                          other_counts]:
+                fp.write(array.tobytes())
+            fp.write(blob)
+            fp.write(other_blob)
+        os.replace(str(tmp_path), str(path))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def read_vocab_file(path):
+    data = np.memmap(str(path), dtype=np.uint8, mode="r")
+    if bytes(data[:len(VOCAB_MAGIC)]) != VOCAB_MAGIC:
+        raise ValueError("{} is not a plum vocab file.".format(path))
+    header = dict(zip(_HEADER, np.frombuffer(
+        data, dtype=np.int64, count=len(_HEADER),
+        offset=len(VOCAB_MAGIC)).tolist()))
+
+    position = _HEADER_SIZE
+    def take(count, dtype=np.int64):
+        nonlocal position
+        array = np.frombuffer(data, dtype=dtype, count=count,
+                              offset=position)
+        position += array.nbytes
+        return array
+
+    offsets = take(header["num_tokens"] + 1)
+    counts = take(header["num_tokens"] if header["has_counts"] else 0)
+    other_offsets = take(header["num_other"] + 1)
+    other_counts = take(header["num_other"])
+    blob = take(header["blob_size"], dtype=np.uint8)
+    other_blob = take(header["other_blob_size"], dtype=np.uint8)
+
+    index2tokens = unpack_tokens(blob, offsets)
+    tokens2index = {token: i for i, token in enumerate(index2tokens)}
+
+    vocab_counts = None
+    if header["has_counts"]:
+        vocab_counts = {
+            token: count
+            for token, count in zip(index2tokens, counts.tolist())
+            if count != -1}
+        vocab_counts.update(zip(unpack_tokens(other_blob, other_offsets),
+                                other_counts.tolist()))
+
+    specials = {}
+    for name in ["pad", "unk", "start", "stop"]:
+        index = header[name]
+        specials[name] = None if index == -1 else index2tokens[index]
+
+    return Vocab(index2tokens=index2tokens, tokens2index=tokens2index,
+                 counts=vocab_counts, **specials)
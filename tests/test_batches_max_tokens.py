@@ -0,0 +1,41 @@
+import pytest
+
+from plum.dataio import Batches, LongTensor, BatchSequenceNDTensor
+
+
+def make_batches(**kwargs):
+    dataset = [{"source": list(range(1, 2 + i % 7)),
+                "target": list(range(1, 2 + (i * 3) % 11))}
+               for i in range(40)]
+    return Batches(
+        dataset=dataset,
+        batch_size=8,
+        shuffle=True,
+        num_workers=0,
+        pipelines={
+            "source": ["source", LongTensor()],
+            "target": ["target", LongTensor()],
+        },
+        collate_funcs={
+            "source": BatchSequenceNDTensor(sequence_dim=0, pad_value=0),
+            "target": BatchSequenceNDTensor(sequence_dim=0, pad_value=0),
+        },
+        seed=0,
+        **kwargs)
+
+def test_max_tokens_requires_keys():
+    with pytest.raises(ValueError):
+        make_batches(max_tokens=40)
+
+def test_max_tokens_counts_every_key():
+    batches = make_batches(max_tokens=40,
+                           max_tokens_keys=[["source", len],
+                                            ["target", len]])
+    num_items = 0
+    for batch in batches:
+        source, target = batch["source"], batch["target"]
+        size = source.lengths.size(0)
+        num_items += size
+        padded = (source.lengths.max() + target.lengths.max()) * size
+        assert size == 1 or padded.item() <= 40
+    assert num_items == 40
@@ -0,0 +1,96 @@
+import gc
+import weakref
+
+import pytest
+import torch
+
+from plum.dataio import Batches, LongTensor, BatchSequenceNDTensor
+from plum.types import Variable
+
+
+requires_cuda = pytest.mark.skipif(
+    not torch.cuda.is_available(), reason="CUDA is not available")
+
+
+def make_dataset(size=37):
+    return [{"tokens": list(range(1, 2 + i % 7)), "label": i % 3}
+            for i in range(size)]
+
+def make_batches(**kwargs):
+    return Batches(
+        dataset=make_dataset(),
+        batch_size=8,
+        shuffle=False,
+        num_workers=0,
+        pipelines={
+            "tokens": ["tokens", LongTensor()],
+            "label": ["label"],
+        },
+        collate_funcs={
+            "tokens": BatchSequenceNDTensor(sequence_dim=0, pad_value=0),
+            "label": LongTensor(),
+        },
+        **kwargs)
+
+def assert_batches_equal(batches1, batches2):
+    assert len(batches1) == len(batches2)
+    for batch1, batch2 in zip(batches1, batches2):
+        assert batch1.keys() == batch2.keys()
+        tokens1, tokens2 = batch1["tokens"], batch2["tokens"]
+        assert torch.equal(tokens1.data.cpu(), tokens2.data.cpu())
+        assert torch.equal(tokens1.lengths.cpu(), tokens2.lengths.cpu())
+        assert tokens1.length_dim == tokens2.length_dim
+        assert tokens1.batch_dim == tokens2.batch_dim
+        assert torch.equal(batch1["label"].cpu(), batch2["label"].cpu())
+
+
+def test_pin_and_prefetch_on_cpu_match_plain_batches():
+    plain = list(make_batches())
+    pinned = list(make_batches(pin_memory=True, prefetch=True))
+    assert len(plain) == 5
+    assert_batches_equal(plain, pinned)
+    for batch in pinned:
+        assert not batch["tokens"].data.is_cuda
+
+def test_close_frees_persistent_batches():
+    batches = make_batches(persistent_workers=True)
+    expected = list(make_batches())
+    for _ in range(2):
+        assert_batches_equal(expected, list(batches))
+    batches.close()
+    ref = weakref.ref(batches)
+    gc.disable()
+    try:
+        del batches
+        assert ref() is None
+    finally:
+        gc.enable()
+
+@requires_cuda
+def test_variable_pin_memory_pins_data_and_lengths():
+    variable = Variable(
+        torch.arange(12).view(3, 4), lengths=torch.LongTensor([4, 2, 3]),
+        length_dim=1, batch_dim=0, pad_value=-1)
+    pinned = variable.pin_memory()
+    assert pinned.data.is_pinned()
+    assert pinned.lengths.is_pinned()
+    assert torch.equal(pinned.data, variable.data)
+    assert torch.equal(pinned.lengths, variable.lengths)
+    assert pinned.length_dim == 1
+    assert pinned.batch_dim == 0
+    assert pinned.pad_value == -1
+
+@requires_cuda
+def test_prefetched_batches_match_batch2gpu():
+    batches = make_batches()
+    batches.gpu = 0
+    expected = list(batches)
+
+    prefetched = make_batches(pin_memory=True, prefetch=True)
+    prefetched.gpu = 0
+    actual = list(prefetched)
+    for batch in actual:
+        assert batch["tokens"].data.is_cuda
+        assert batch["tokens"].lengths.is_cuda
+        assert batch["label"].is_cuda
+    assert_batches_equal(expected, actual)
@@ -0,0 +1,102 @@
+import pytest
+import torch
+
+from plum.seq2seq.search import BeamSearch, GreedySearch
+from plum.types import Variable
+from plum.vocab import Vocab
+
+
+class ToyDecoder(object):
+    # A small deterministic recurrent decoder with the search api of
+    # seq2seq decoders, whose stop token gets more likely at every step.
+
+    def __init__(self, vocab, hidden_size=16, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        self.vocab = vocab
+        self.embeddings = torch.randn(
+            len(vocab), hidden_size, generator=generator)
+        self.recurrent = torch.randn(
+            hidden_size, hidden_size, generator=generator) \
+            / hidden_size ** .5
+        self.output = torch.randn(
+            hidden_size, len(vocab), generator=generator)
+
+    def init_search_context(self, encoder_output, shortlist=None):
+        return {"encoder_output": encoder_output}
+
+    def next_state(self, prev_state, search_context, controls=None):
+        inputs = self.embeddings[prev_state["output"].data]
+        source = search_context["encoder_output"].data.mean(0, keepdim=True)
+        state = torch.tanh(
+            prev_state["decoder_state"].matmul(self.recurrent)
+            + inputs + source)
+        logits = state.matmul(self.output)
+        logits[:, :, self.vocab.stop_index] += state[:, :, 0] * 4 - 1
+        log_probs = logits.log_softmax(2)
+        lengths = prev_state["output"].lengths
+        return {
+            "decoder_state": state,
+            "log_probs": Variable(log_probs, lengths=lengths,
+                                  length_dim=0, batch_dim=1),
+            "output": Variable(log_probs.argmax(2), lengths=lengths,
+                               length_dim=0, batch_dim=1,
+                               pad_value=self.vocab.pad_index),
+        }
+
+def make_encoder_state(batch_size, hidden_size=16, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    output = torch.randn(5, batch_size, hidden_size, generator=generator)
+    return {
+        "output": Variable(output,
+                           lengths=torch.LongTensor([5] * batch_size),
+                           length_dim=0, batch_dim=1),
+        "state": torch.randn(1, batch_size, hidden_size, generator=generator),
+    }
+
+@pytest.mark.parametrize("beam_size", [1, 4])
+def test_compacted_beam_search_matches_uncompacted(beam_size):
+    vocab = Vocab.from_list(["w{}".format(i) for i in range(20)],
+                            pad="<pad>", start="<sos>", stop="<eos>")
+    decoder = ToyDecoder(vocab)
+    encoder_state = make_encoder_state(12)
+
+    results = []
+    for compact in (False, True):
+        search = BeamSearch(max_steps=30, beam_size=beam_size, vocab=vocab,
+                            compact=compact)
+        search(decoder, encoder_state)
+        results.append(search)
+    full, compacted = results
+
+    # Items must finish at different steps for rows to be dropped.
+    lengths = full._lengths[:, 0]
+    assert lengths.min().item() < lengths.max().item()
+    assert lengths.min().item() < 30
+
+    assert torch.equal(full._output, compacted._output)
+    assert torch.equal(full._lengths, compacted._lengths)
+    assert torch.equal(full._incomplete_items, compacted._incomplete_items)
+    # Scores come from reductions over different numbers of rows, so they
+    # only agree up to float rounding.
+    assert torch.allclose(full._beam_scores, compacted._beam_scores,
+                          rtol=1e-5, atol=1e-6)
+    assert full.output(n_best=beam_size) \
+        == compacted.output(n_best=beam_size)
+
+def test_greedy_search_matches_single_beam():
+    vocab = Vocab.from_list(["w{}".format(i) for i in range(20)],
+                            pad="<pad>", start="<sos>", stop="<eos>")
+    decoder = ToyDecoder(vocab)
+    encoder_state = make_encoder_state(12)
+
+    beam = BeamSearch(max_steps=30, beam_size=1, vocab=vocab)
+    beam(decoder, encoder_state)
+    greedy = GreedySearch(max_steps=30, vocab=vocab)
+    greedy(decoder, encoder_state)
+
+    assert greedy.output() == beam.output()
+    # Steps after an item's stop token are masked.
+    lengths = beam._lengths[:, 0]
+    steps = torch.arange(greedy._mask_T.size(0)).view(-1, 1)
+    assert torch.equal(greedy._mask_T.ne(0),
+                       (steps >= lengths.view(1, -1)).ne(0))
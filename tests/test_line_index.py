@@ -0,0 +1,62 @@
+import json
+import os
+
+import numpy as np
+
+from plum.dataio import MMAPJSONL
+from plum.dataio.fingerprint import file_fingerprint, \
+    _FINGERPRINT_BLOCKS, _FINGERPRINT_BLOCK_SIZE
+from plum.dataio.compiled_pipelines import pipelines_signature
+from plum.dataio.line_index import index_path
+
+
+def write_records(path, records):
+    with open(str(path), "w") as fp:
+        for record in records:
+            fp.write(json.dumps(record) + "\n")
+
+def test_offset_index_rebuilt_after_same_size_edit(tmp_path):
+    # A file larger than the sampled fingerprint covers, edited so that its
+    # size and fingerprint stay the same but its newlines move.
+    path = tmp_path / "data.jsonl"
+    records = [{"text": "x" * 100} for _ in range(60000)]
+    write_records(path, records)
+    assert MMAPJSONL(path=str(path))[1] == records[1]
+    assert index_path(path).exists()
+
+    size = os.stat(str(path)).st_size
+    fingerprint = file_fingerprint(path)
+    # Edit two lines right after the end of the first sampled block.
+    line_size = size // len(records)
+    block_starts = np.linspace(0, size - _FINGERPRINT_BLOCK_SIZE,
+                               _FINGERPRINT_BLOCKS).astype(np.int64)
+    assert block_starts[1] - _FINGERPRINT_BLOCK_SIZE > 4 * line_size
+    line = _FINGERPRINT_BLOCK_SIZE // line_size + 1
+    records[line] = {"text": "x" * 50}
+    records[line + 1] = {"text": "x" * 150}
+    write_records(path, records)
+    os.utime(str(path), ns=(0, 10 ** 18))
+    assert os.stat(str(path)).st_size == size
+    assert file_fingerprint(path) == fingerprint
+
+    ds = MMAPJSONL(path=str(path))
+    assert ds[line] == records[line]
+    assert ds[line + 1] == records[line + 1]
+
+def test_pipelines_signature_changes_after_same_size_edit(tmp_path):
+    path = tmp_path / "data.jsonl"
+    records = [{"text": "x" * 100} for _ in range(60000)]
+    write_records(path, records)
+    ds = MMAPJSONL(path=str(path))
+    pipelines = {"text": ["text"]}
+    signature = pipelines_signature(ds, pipelines)
+    assert pipelines_signature(ds, pipelines) == signature
+
+    # Same size and sampled fingerprint, but different data.
+    fingerprint = file_fingerprint(path)
+    line = _FINGERPRINT_BLOCK_SIZE // (len(json.dumps(records[0])) + 1) + 1
+    records[line] = {"text": "y" * 100}
+    write_records(path, records)
+    os.utime(str(path), ns=(0, 10 ** 18))
+    assert file_fingerprint(path) == fingerprint
+    assert pipelines_signature(ds, pipelines) != signature
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from plum.dataio import Batches, JSONL, MMAPJSONL, LongTensor
+
+
+def write_records(path):
+    records = [{"tokens": list(range(1, 2 + i % 5)), "label": i % 3,
+                "original": "x" * 20} for i in range(12)]
+    with open(str(path), "w") as fp:
+        for record in records:
+            fp.write(json.dumps(record) + "\n")
+    return records
+
+def make_batches(dataset):
+    return Batches(
+        dataset=dataset,
+        batch_size=4,
+        shuffle=False,
+        num_workers=0,
+        pipelines={"label": ["label", LongTensor()]},
+        collate_funcs={"label": LongTensor()},
+        sort=True,
+        sort_key=["tokens", len],
+        project_fields=True)
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_project_fields_prunes_jsonl_records(tmp_path, compact):
+    path = tmp_path / "data.jsonl"
+    records = write_records(path)
+    dataset = JSONL(path=str(path), compact=compact)
+    batches = make_batches(dataset)
+    assert dataset[3] == {"tokens": records[3]["tokens"],
+                          "label": records[3]["label"]}
+    assert sum(len(batch["label"]) for batch in batches) == len(records)
+
+def test_project_fields_rejects_mmap_jsonl(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_records(path)
+    with pytest.raises(ValueError):
+        make_batches(MMAPJSONL(path=str(path)))